@@ -0,0 +1,66 @@
+import json
+
+import click
+from flask import current_app
+
+
+def register_commands(app):
+    """管理用のCLIコマンドを登録（flask --app src/main.py <command>）"""
+
+    @app.cli.command('export-static')
+    @click.option('--output', '-o', default=None, help='出力先ディレクトリ（省略時は STATIC_EXPORT_DIR）')
+    @click.option('--full', is_flag=True, help='前回の結果を使わずにすべて再生成する')
+    def export_static_command(output, full):
+        """公開中のWikiを静的スナップショットとして書き出す"""
+        from src.services.static_export import export_static
+
+        result = export_static(output or current_app.config['STATIC_EXPORT_DIR'], full=full)
+        click.echo(json.dumps(result, ensure_ascii=False))
+
+    @app.cli.command('rebuild-links')
+    def rebuild_links_command():
+        """全ページの内部リンクインデックスを再構築する"""
+        from src.services.links import rebuild_links
+
+        result = rebuild_links()
+        click.echo(json.dumps(result, ensure_ascii=False))
+
+    @app.cli.command('purge-trash')
+    @click.option('--days', default=30, show_default=True, help='ゴミ箱に移動してからこの日数を過ぎたページを削除')
+    def purge_trash_command(days):
+        """ゴミ箱の古いページを完全に削除する"""
+        from src.services.trash import purge_trash
+
+        click.echo(json.dumps({'purged': purge_trash(older_than_days=days)}))
+
+    @app.cli.command('backup')
+    @click.option('--no-compress', is_flag=True, help='gzip圧縮しない')
+    @click.option('--keep', default=None, type=int, help='残すバックアップの数（省略時は BACKUP_KEEP）')
+    def backup_command(no_compress, keep):
+        """稼働中のデータベースをオンラインバックアップする（cronからの定期実行向け）"""
+        from src.services.backup import create_backup, rotate_backups
+
+        backup_dir = current_app.config['BACKUP_DIR']
+        result = create_backup(backup_dir, compress=not no_compress)
+        result['rotated'] = rotate_backups(backup_dir, keep if keep is not None else current_app.config['BACKUP_KEEP'])
+        click.echo(json.dumps(result, ensure_ascii=False))
+
+    @app.cli.command('restore-backup')
+    @click.argument('path')
+    @click.option('--no-safety-backup', is_flag=True, help='復元前に現在のデータベースをバックアップしない')
+    @click.confirmation_option(prompt='現在のデータベースを上書きします。よろしいですか？')
+    def restore_backup_command(path, no_safety_backup):
+        """バックアップファイルからデータベースを復元する"""
+        from src.services.backup import restore_backup
+
+        backup_dir = None if no_safety_backup else current_app.config['BACKUP_DIR']
+        result = restore_backup(path, backup_dir=backup_dir)
+        click.echo(json.dumps(result, ensure_ascii=False))
+
+    @app.cli.command('gc-attachments')
+    @click.option('--grace-hours', default=24, show_default=True, help='作成からこの時間以内の添付ファイルは残す')
+    def gc_attachments_command(grace_hours):
+        """どのページからも参照されていない添付ファイルを削除する"""
+        from src.services.attachments import collect_garbage
+
+        click.echo(json.dumps(collect_garbage(grace_hours=grace_hours)))
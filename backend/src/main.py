@@ -5,32 +5,78 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
-from src.models.wiki import db
+from werkzeug.middleware.proxy_fix import ProxyFix
+from src.models.wiki import db, upgrade_schema
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.pages import pages_bp
 from src.routes.menus import menus_bp
+from src.routes.admin import admin_bp
+from src.routes.bootstrap import bootstrap_bp
+from src.routes.attachments import attachments_bp
+from src.services.profiler import RequestProfiler
+from src.services.view_counter import ViewCounter
+from src.services.backup import BackupScheduler
+from src.services.rate_limit import RateLimiter
+from src.commands import register_commands
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'zen-wiki-secret-key-change-in-production'
 
 # CORS設定
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"])
+CORS(app, origins="*", allow_headers=["Content-Type", "Authorization", "X-Profile", "X-Filename"], expose_headers=["X-Profile-Id", "Retry-After"])
+
+# リバースプロキシの背後で動かす場合は、IP単位のレート制限のためにプロキシの段数を指定する
+if int(os.getenv('TRUSTED_PROXIES', '0')) > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('TRUSTED_PROXIES')))
+
+# リクエスト単位のプロファイラ（PROFILE_SAMPLE_RATE または管理者の X-Profile ヘッダーで有効）
+RequestProfiler(app)
+
+# 検索・ログイン・書き込みのレート制限（RATE_LIMIT_BACKEND=sqlite で全ワーカーが共有）
+RateLimiter(app)
 
 # ブループリントの登録
 app.register_blueprint(user_bp, url_prefix='/api/users')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(pages_bp, url_prefix='/api/pages')
 app.register_blueprint(menus_bp, url_prefix='/api/menus')
+app.register_blueprint(admin_bp, url_prefix='/api/admin')
+app.register_blueprint(bootstrap_bp, url_prefix='/api/bootstrap')
+app.register_blueprint(attachments_bp, url_prefix='/api/attachments')
 
 # データベース設定
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+# ページ閲覧数の集計（VIEW_FLUSH_INTERVAL 秒ごとにまとめて書き込む）
+ViewCounter(app)
+
+# 静的スナップショットの出力先（flask export-static で生成し /snapshot/ で配信）
+app.config['STATIC_EXPORT_DIR'] = os.getenv('STATIC_EXPORT_DIR', os.path.join(os.path.dirname(__file__), 'export'))
+
+# バックアップ（flask backup / /api/admin/backups、BACKUP_INTERVAL_HOURS を指定すると定期実行）
+app.config['BACKUP_DIR'] = os.getenv('BACKUP_DIR', os.path.join(os.path.dirname(__file__), 'database', 'backups'))
+app.config['BACKUP_KEEP'] = int(os.getenv('BACKUP_KEEP', '7'))
+app.config['BACKUP_INTERVAL_HOURS'] = float(os.getenv('BACKUP_INTERVAL_HOURS', '0'))
+
+# 添付ファイル（内容のSHA-256で保存し、同じファイルは1つにまとめる）
+app.config['ATTACHMENT_DIR'] = os.getenv('ATTACHMENT_DIR', os.path.join(os.path.dirname(__file__), 'database', 'attachments'))
+app.config['ATTACHMENT_MAX_SIZE'] = int(os.getenv('ATTACHMENT_MAX_SIZE', str(20 * 1024 * 1024)))
+app.config['ATTACHMENT_THUMBNAIL_WORKERS'] = int(os.getenv('ATTACHMENT_THUMBNAIL_WORKERS', '2'))
+
+register_commands(app)
+
 # データベースの初期化
 with app.app_context():
+    # 既存のデータベースに後から追加したテーブルは、既存のページから内容を作る
+    needs_link_rebuild = not db.inspect(db.engine).has_table('page_links')
     db.create_all()
+    upgrade_schema()
+    if needs_link_rebuild:
+        from src.services.links import rebuild_links
+        rebuild_links()
     
     # 初期データの作成
     from src.models.wiki import User, Page, Menu
@@ -83,9 +129,16 @@ with app.app_context():
         
         db.session.commit()
 
+if app.config['BACKUP_INTERVAL_HOURS'] > 0:
+    BackupScheduler(app).start()
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
+    # 静的スナップショットはDBにアクセスせずにそのまま返す
+    if path.startswith('snapshot/'):
+        return serve_snapshot(path[len('snapshot/'):])
+
     static_folder_path = app.static_folder
     if static_folder_path is None:
             return "Static folder not configured", 404
@@ -99,6 +152,20 @@ def serve(path):
         else:
             return "index.html not found", 404
 
+def serve_snapshot(filename):
+    """静的スナップショットのファイルを配信"""
+    from src.services.static_export import MANIFEST_NAME, HASHED_FILE_RE, SNAPSHOT_CSP
+
+    response = send_from_directory(app.config['STATIC_EXPORT_DIR'], filename)
+    response.headers['Content-Security-Policy'] = SNAPSHOT_CSP
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if HASHED_FILE_RE.search(filename):
+        # 内容ハッシュ付きのファイルは変更されないので長期キャッシュ可能
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    elif filename == MANIFEST_NAME:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return {'status': 'healthy', 'message': 'Zen Wiki API is running'}
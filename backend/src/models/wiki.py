@@ -6,12 +6,18 @@ db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # 管理画面のユーザー一覧（役割での絞り込み＋ID順）とユーザー名の前方一致検索用
+        db.Index('ix_users_role_id', 'role', 'id'),
+        db.Index('ix_users_username', 'username'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     discord_id = db.Column(db.String(50), unique=True, nullable=False)
     username = db.Column(db.String(100), nullable=False)
     avatar_url = db.Column(db.String(500))
     role = db.Column(db.String(20), default='viewer')  # viewer, editor, admin
+    role_overridden = db.Column(db.Boolean, default=False)  # 管理画面で役割を設定した場合はTrue（ログイン時に上書きしない）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45))  # IPv6対応
@@ -28,6 +34,7 @@ class User(db.Model):
             'username': self.username,
             'avatar_url': self.avatar_url,
             'role': self.role,
+            'role_overridden': bool(self.role_overridden),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'last_login': self.last_login.isoformat() if self.last_login else None
         }
@@ -43,10 +50,19 @@ class Page(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_published = db.Column(db.Boolean, default=True)
+    deleted_at = db.Column(db.DateTime, index=True)  # ゴミ箱に移動した日時（NULLなら通常のページ）
     
-    # リレーション
-    histories = db.relationship('PageHistory', backref='page', lazy=True, cascade='all, delete-orphan')
-    menu_items = db.relationship('Menu', backref='page', lazy=True)
+    # リレーション（ページの完全削除は purge_page が集合演算で行うため、ここでは読み込まない）
+    histories = db.relationship('PageHistory', backref='page', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    menu_items = db.relationship('Menu', backref='page', lazy=True, passive_deletes=True)
+    links = db.relationship('PageLink', backref='source_page', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    view_stats = db.relationship('PageViewDaily', backref='page', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    attachment_refs = db.relationship('PageAttachment', backref='page', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    
+    @classmethod
+    def visible(cls):
+        """閲覧者に見せるページ（公開中かつゴミ箱にない）の条件"""
+        return db.and_(cls.is_published == True, cls.deleted_at.is_(None))
     
     def to_dict(self):
         return {
@@ -60,12 +76,22 @@ class Page(db.Model):
             'is_published': self.is_published
         }
 
+    def to_summary_dict(self):
+        """本文を含まない一覧表示用の辞書"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'slug': self.slug,
+            'author': self.author.username if self.author else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class Menu(db.Model):
     __tablename__ = 'menus'
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    page_id = db.Column(db.Integer, db.ForeignKey('pages.id'), nullable=True)
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id', ondelete='SET NULL'), nullable=True)
     parent_id = db.Column(db.Integer, db.ForeignKey('menus.id'), nullable=True)
     order_index = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
@@ -78,7 +104,7 @@ class Menu(db.Model):
             'id': self.id,
             'title': self.title,
             'page_id': self.page_id,
-            'page_slug': self.page.slug if self.page else None,
+            'page_slug': self.page.slug if self.page and self.page.deleted_at is None else None,
             'parent_id': self.parent_id,
             'order_index': self.order_index,
             'is_active': self.is_active,
@@ -89,7 +115,7 @@ class PageHistory(db.Model):
     __tablename__ = 'page_histories'
     
     id = db.Column(db.Integer, primary_key=True)
-    page_id = db.Column(db.Integer, db.ForeignKey('pages.id'), nullable=False)
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id', ondelete='CASCADE'), nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -103,3 +129,96 @@ class PageHistory(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class PageLink(db.Model):
+    """ページ本文から抽出した内部リンク（リンク元ページ → リンク先スラッグ）"""
+    __tablename__ = 'page_links'
+    __table_args__ = (
+        db.UniqueConstraint('source_page_id', 'target_slug', name='uq_page_links_source_target'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source_page_id = db.Column(db.Integer, db.ForeignKey('pages.id', ondelete='CASCADE'), nullable=False, index=True)
+    target_slug = db.Column(db.String(200), nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'source_page_id': self.source_page_id,
+            'target_slug': self.target_slug
+        }
+
+class PageViewDaily(db.Model):
+    """ページの日別閲覧数（ViewCounterがまとめて加算する）"""
+    __tablename__ = 'page_view_daily'
+    __table_args__ = (
+        db.UniqueConstraint('page_id', 'day', name='uq_page_view_daily_page_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'page_id': self.page_id,
+            'day': self.day.isoformat(),
+            'views': self.views
+        }
+
+class Attachment(db.Model):
+    """アップロードされたファイル（内容のSHA-256で重複を排除して保存）"""
+    __tablename__ = 'attachments'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    filename = db.Column(db.String(255))
+    uploader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # 最後に同じ内容がアップロードされた日時（GCの猶予期間はここから数える）
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # リレーション
+    page_refs = db.relationship('PageAttachment', backref='attachment', lazy=True, passive_deletes=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sha256': self.sha256,
+            'size': self.size,
+            'content_type': self.content_type,
+            'filename': self.filename,
+            'url': f'/api/attachments/{self.sha256}',
+            'thumbnail_url': f'/api/attachments/{self.sha256}/thumbnail' if self.content_type.startswith('image/') else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class PageAttachment(db.Model):
+    """ページ本文から参照されている添付ファイル（未参照のファイルはGCの対象）"""
+    __tablename__ = 'page_attachments'
+    
+    page_id = db.Column(db.Integer, db.ForeignKey('pages.id', ondelete='CASCADE'), primary_key=True)
+    attachment_id = db.Column(db.Integer, db.ForeignKey('attachments.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+def upgrade_schema():
+    """既存のデータベースに、create_all では追加されない列とインデックスを追加する
+
+    追加できるのはNULL許容の列のみ（既存の行はNULLになる）。
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        db.session.commit()
+        
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
@@ -0,0 +1,191 @@
+from flask import Blueprint, request, jsonify, Response, current_app
+from flask_cors import cross_origin
+from src.routes.auth import require_auth, require_role
+from src.services.profiler import get_profiler, summarize, top_functions, MODES, MODE_SAMPLE, MODE_CPROFILE
+from src.services.backup import BackupError, create_backup, list_backups, rotate_backups, resolve_backup, verify_backup
+from src.services.rate_limit import get_rate_limiter
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/profiles', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def get_profiles():
+    """保存されているプロファイル一覧を取得（このワーカープロセス分）"""
+    try:
+        records = get_profiler().store.list()
+        return jsonify({
+            'settings': {
+                'sample_rate': current_app.config['PROFILE_SAMPLE_RATE'],
+                'mode': current_app.config['PROFILE_MODE']
+            },
+            'profiles': [summarize(record) for record in records]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles', methods=['DELETE'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def clear_profiles():
+    """保存されているプロファイルを削除"""
+    try:
+        get_profiler().store.clear()
+        return jsonify({'message': 'Profiles cleared successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles/settings', methods=['PUT'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def update_profile_settings():
+    """サンプリング率とプロファイル方式を変更（このワーカープロセスのみ）"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        if 'sample_rate' in data:
+            sample_rate = float(data['sample_rate'])
+            if not 0 <= sample_rate <= 1:
+                return jsonify({'error': 'sample_rate must be between 0 and 1'}), 400
+            current_app.config['PROFILE_SAMPLE_RATE'] = sample_rate
+        if 'mode' in data:
+            if data['mode'] not in MODES:
+                return jsonify({'error': f"mode must be one of: {', '.join(MODES)}"}), 400
+            current_app.config['PROFILE_MODE'] = data['mode']
+
+        return jsonify({
+            'sample_rate': current_app.config['PROFILE_SAMPLE_RATE'],
+            'mode': current_app.config['PROFILE_MODE']
+        })
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid sample_rate'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def get_profile(profile_id):
+    """プロファイルの要約と上位の関数・スタックを取得"""
+    try:
+        record = get_profiler().store.get(profile_id)
+        if not record:
+            return jsonify({'error': 'Profile not found'}), 404
+
+        result = summarize(record)
+        result['top_functions'] = top_functions(record)
+        if record['mode'] == MODE_SAMPLE:
+            result['top_stacks'] = (record['collapsed'] or '').splitlines()[:30]
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles/<profile_id>/pstats', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def download_profile_pstats(profile_id):
+    """pstats.Stats で読み込めるファイルとしてダウンロード（cprofile方式のみ）"""
+    record = get_profiler().store.get(profile_id)
+    if not record or record['mode'] != MODE_CPROFILE:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    return Response(
+        record['stats'],
+        mimetype='application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.pstats'}
+    )
+
+@admin_bp.route('/profiles/<profile_id>/collapsed', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def download_profile_collapsed(profile_id):
+    """flamegraph形式（collapsed stacks）でダウンロード（sample方式のみ）"""
+    record = get_profiler().store.get(profile_id)
+    if not record or record['mode'] != MODE_SAMPLE:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    # サンプリング間隔より短いリクエストはサンプルが0件になるため、空のファイルを返す
+    collapsed = record['collapsed']
+    return Response(collapsed + '\n' if collapsed else '', mimetype='text/plain')
+
+@admin_bp.route('/backups', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def get_backups():
+    """バックアップ一覧を取得"""
+    try:
+        return jsonify(list_backups(current_app.config['BACKUP_DIR']))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/backups', methods=['POST'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def create_database_backup():
+    """稼働中のデータベースをバックアップし、古いものをローテーション"""
+    try:
+        data = request.get_json(silent=True) or {}
+        backup_dir = current_app.config['BACKUP_DIR']
+
+        result = create_backup(backup_dir, compress=data.get('compress', True))
+        result['rotated'] = rotate_backups(backup_dir, current_app.config['BACKUP_KEEP'])
+        return jsonify(result), 201
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/backups/<name>/verify', methods=['POST'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def verify_database_backup(name):
+    """バックアップファイルの整合性を検査"""
+    try:
+        path = resolve_backup(current_app.config['BACKUP_DIR'], name)
+        integrity = verify_backup(path)
+        return jsonify({'name': name, 'ok': integrity == 'ok', 'integrity_check': integrity})
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/rate-limits', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def get_rate_limits():
+    """レート制限の設定と拒否件数を取得（このワーカープロセス分）"""
+    try:
+        limiter = get_rate_limiter()
+        return jsonify({
+            'enabled': current_app.config['RATE_LIMIT_ENABLED'],
+            'backend': limiter.backend.name,
+            'limits': current_app.config['RATE_LIMITS'],
+            'blueprints': current_app.config['RATE_LIMIT_BLUEPRINTS'],
+            'metrics': limiter.metrics.to_dict()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/rate-limits', methods=['DELETE'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def reset_rate_limit_metrics():
+    """拒否件数の集計をリセット"""
+    try:
+        get_rate_limiter().metrics.reset()
+        return jsonify({'message': 'Rate limit metrics reset successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,108 @@
+import os
+import re
+from urllib.parse import unquote
+from flask import Blueprint, request, jsonify, send_file, current_app
+from flask_cors import cross_origin
+from src.models.wiki import Attachment, PageAttachment
+from src.routes.auth import require_auth, require_role
+from src.services.attachments import AttachmentError, save_upload, storage_path, thumbnail_path
+
+attachments_bp = Blueprint('attachments', __name__)
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# 内容ハッシュのURLは内容が変わらないので1年間キャッシュさせる
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def _send_attachment(path, attachment, etag):
+    """Rangeリクエスト・条件付きリクエストに対応して配信"""
+    response = send_file(
+        path,
+        mimetype=attachment.content_type,
+        conditional=True,
+        etag=etag,
+        max_age=IMMUTABLE_MAX_AGE,
+        download_name=attachment.filename or attachment.sha256,
+        as_attachment=not attachment.content_type.startswith('image/')
+    )
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+@attachments_bp.route('', methods=['POST'])
+@cross_origin()
+@require_auth
+@require_role('editor')
+def upload_attachment():
+    """添付ファイルをアップロード
+
+    リクエストボディにファイルの内容をそのまま送る（multipartではない）。
+    ファイル名は X-Filename ヘッダー（URLエンコード）または ?filename= で指定する。
+    """
+    try:
+        # ヘッダーにはASCIIしか送れないため、X-Filename はURLエンコードされている
+        filename = unquote(request.headers.get('X-Filename', '')) or request.args.get('filename')
+        attachment, created = save_upload(request.stream, filename, request.current_user.id)
+        return jsonify(attachment.to_dict()), 201 if created else 200
+    except AttachmentError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@attachments_bp.route('', methods=['GET'])
+@cross_origin()
+@require_auth
+def get_page_attachments():
+    """ページから参照されている添付ファイル一覧を取得（?page_id=）"""
+    try:
+        page_id = request.args.get('page_id', type=int)
+        if not page_id:
+            return jsonify({'error': 'page_id is required'}), 400
+
+        attachments = Attachment.query.join(
+            PageAttachment, PageAttachment.attachment_id == Attachment.id
+        ).filter(PageAttachment.page_id == page_id).order_by(Attachment.created_at).all()
+        return jsonify([attachment.to_dict() for attachment in attachments])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@attachments_bp.route('/<sha256>', methods=['GET'])
+@cross_origin()
+def get_attachment(sha256):
+    """添付ファイルを配信"""
+    if not SHA256_RE.match(sha256):
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    attachment = Attachment.query.filter_by(sha256=sha256).first()
+    path = storage_path(current_app.config['ATTACHMENT_DIR'], sha256)
+    if not attachment or not os.path.exists(path):
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    return _send_attachment(path, attachment, sha256)
+
+@attachments_bp.route('/<sha256>/thumbnail', methods=['GET'])
+@cross_origin()
+def get_attachment_thumbnail(sha256):
+    """サムネイルを配信（生成前・生成できない場合は元の画像）"""
+    if not SHA256_RE.match(sha256):
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    attachment = Attachment.query.filter_by(sha256=sha256).first()
+    if not attachment or not attachment.content_type.startswith('image/'):
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    storage_dir = current_app.config['ATTACHMENT_DIR']
+    thumbnail = thumbnail_path(storage_dir, sha256)
+    if os.path.exists(thumbnail):
+        response = send_file(thumbnail, mimetype='image/webp', conditional=True, etag=f'{sha256}-thumb', max_age=IMMUTABLE_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return response
+
+    path = storage_path(storage_dir, sha256)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Attachment not found'}), 404
+
+    # 生成後はサムネイルを返せるよう、元画像はキャッシュさせない
+    response = _send_attachment(path, attachment, sha256)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -5,6 +5,7 @@ import os
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from src.models.wiki import db, User
+from src.services.rate_limit import rate_limit
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -33,6 +34,7 @@ def discord_login():
 
 @auth_bp.route('/callback', methods=['GET'])
 @cross_origin()
+@rate_limit('login')
 def discord_callback():
     """Discord OAuth コールバック処理"""
     code = request.args.get('code')
@@ -85,6 +87,9 @@ def discord_callback():
         # ユーザーをデータベースに保存または更新
         user = User.query.filter_by(discord_id=discord_id).first()
         if user:
+            # 管理画面で設定された役割は保持し、それ以外は環境変数の役割に合わせる
+            if user.role_overridden:
+                role = user.role
             user.username = username
             user.avatar_url = avatar_url
             user.role = role
@@ -153,6 +158,26 @@ def logout():
     # JWTトークンベースなので、クライアント側でトークンを削除するだけ
     return jsonify({'message': 'Logged out successfully'})
 
+def get_token_user_id():
+    """Authorizationヘッダーのトークンからユーザーidを取得（DBにはアクセスしない。無効な場合はNone）"""
+    token = request.headers.get('Authorization')
+    if not token:
+        return None
+    
+    if token.startswith('Bearer '):
+        token = token[7:]
+    
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except JWTError:
+        return None
+    return payload.get('user_id')
+
+def get_user_from_request():
+    """Authorizationヘッダーのトークンからユーザーを取得（未ログイン・無効な場合はNone）"""
+    user_id = get_token_user_id()
+    return User.query.get(user_id) if user_id else None
+
 def require_auth(f):
     """認証が必要なエンドポイント用のデコレータ"""
     def decorated_function(*args, **kwargs):
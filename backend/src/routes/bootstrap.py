@@ -0,0 +1,75 @@
+import hashlib
+import json
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from sqlalchemy.orm import defer, joinedload
+from src.models.wiki import db, Page, Menu
+from src.routes.auth import get_user_from_request
+from src.services.view_counter import get_view_counter
+
+bootstrap_bp = Blueprint('bootstrap', __name__)
+
+def _etag(value):
+    """値から短いETagを生成"""
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+def _client_etags():
+    """クライアントが保持している各パーツのETag（?etags=menus:xxx,pages:yyy）"""
+    etags = {}
+    for item in request.args.get('etags', '').split(','):
+        name, _, value = item.partition(':')
+        if name and value:
+            etags[name.strip()] = value.strip()
+    return etags
+
+@bootstrap_bp.route('', methods=['GET'])
+@cross_origin()
+def get_bootstrap():
+    """初期表示に必要なデータ（ユーザー・メニュー・ページ一覧・初期ページ）を一括取得
+
+    クライアントが送ったETagと一致したパーツは省略し、unchanged に名前を入れて返す。
+    """
+    try:
+        client_etags = _client_etags()
+        result = {'etags': {}, 'unchanged': []}
+
+        def add_part(name, etag, load):
+            result['etags'][name] = etag
+            if client_etags.get(name) == etag:
+                result['unchanged'].append(name)
+            else:
+                result[name] = load()
+
+        # 現在のユーザー（トークンがない・無効な場合はNone）
+        user = get_user_from_request()
+        user_data = user.to_dict() if user else None
+        add_part('user', _etag(user_data), lambda: user_data)
+
+        # メニューは件数が少ないので組み立ててからハッシュを取る
+        root_menus = Menu.query.filter_by(parent_id=None, is_active=True).order_by(Menu.order_index).all()
+        menus_data = [menu.to_dict() for menu in root_menus]
+        add_part('menus', _etag(menus_data), lambda: menus_data)
+
+        # ページ一覧は件数と最終更新日時だけで変更を判定し、一致すれば読み込まない
+        count, last_updated = db.session.query(
+            db.func.count(Page.id), db.func.max(Page.updated_at)
+        ).filter(Page.visible()).one()
+        add_part('pages', _etag([count, last_updated]), lambda: [
+            page.to_summary_dict() for page in Page.query.options(
+                defer(Page.content), joinedload(Page.author)
+            ).filter(Page.visible()).order_by(Page.updated_at.desc()).all()
+        ])
+
+        # 初期ページ（?page=slug、省略時は home）
+        slug = request.args.get('page', 'home')
+        page = Page.query.filter(Page.slug == slug, Page.visible()).first()
+        if page:
+            get_view_counter().record(page.id)
+            add_part('page', _etag([page.id, page.updated_at]), page.to_dict)
+        else:
+            result['page'] = None
+
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
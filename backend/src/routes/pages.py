@@ -3,10 +3,19 @@ from flask_cors import cross_origin
 from datetime import datetime
 from src.models.wiki import db, Page, PageHistory, User
 from src.routes.auth import require_auth, require_role
+from src.services.links import sync_page_links, rewrite_links, rename_slug_links, get_backlinks, get_broken_links
+from src.services.suggest import title_index
+from src.services.view_counter import get_view_counter, get_popular_pages, get_daily_views
+from src.services.trash import move_to_trash, restore_page, purge_pages
+from src.services.attachments import sync_page_attachments
+from src.services.rate_limit import rate_limit
 import re
 
 pages_bp = Blueprint('pages', __name__)
 
+# /<slug> と同じ階層にある固定のパス（ページのスラッグには使えない）
+RESERVED_SLUGS = {'trash', 'suggest', 'search', 'popular'}
+
 def create_slug(title):
     """タイトルからURLスラッグを生成"""
     # 日本語文字を含む場合の処理
@@ -14,12 +23,16 @@ def create_slug(title):
     slug = re.sub(r'[-\s]+', '-', slug)
     return slug.strip('-')
 
+def is_slug_taken(slug):
+    """スラッグが既存のページか固定のパスと重複しているか"""
+    return slug in RESERVED_SLUGS or Page.query.filter_by(slug=slug).first() is not None
+
 @pages_bp.route('', methods=['GET'])
 @cross_origin()
 def get_pages():
     """ページ一覧を取得"""
     try:
-        pages = Page.query.filter_by(is_published=True).order_by(Page.updated_at.desc()).all()
+        pages = Page.query.filter(Page.visible()).order_by(Page.updated_at.desc()).all()
         return jsonify([page.to_dict() for page in pages])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -29,10 +42,11 @@ def get_pages():
 def get_page(slug):
     """特定のページを取得"""
     try:
-        page = Page.query.filter_by(slug=slug, is_published=True).first()
+        page = Page.query.filter(Page.slug == slug, Page.visible()).first()
         if not page:
             return jsonify({'error': 'Page not found'}), 404
         
+        get_view_counter().record(page.id)
         return jsonify(page.to_dict())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -52,15 +66,13 @@ def create_page():
         content = data.get('content', '')
         slug = data.get('slug') or create_slug(title)
         
-        # スラッグの重複チェック
-        existing_page = Page.query.filter_by(slug=slug).first()
-        if existing_page:
+        # スラッグの重複チェック（固定のパスと同じスラッグも使えない）
+        if is_slug_taken(slug):
             # 重複する場合は番号を追加
             counter = 1
             original_slug = slug
-            while existing_page:
+            while is_slug_taken(slug):
                 slug = f"{original_slug}-{counter}"
-                existing_page = Page.query.filter_by(slug=slug).first()
                 counter += 1
         
         # 新しいページを作成
@@ -81,7 +93,10 @@ def create_page():
             author_id=request.current_user.id
         )
         db.session.add(history)
+        sync_page_links(page)
+        sync_page_attachments(page)
         db.session.commit()
+        title_index.upsert(page)
         
         return jsonify(page.to_dict()), 201
         
@@ -97,7 +112,7 @@ def update_page(page_id):
     """ページを更新"""
     try:
         page = Page.query.get(page_id)
-        if not page:
+        if not page or page.deleted_at is not None:
             return jsonify({'error': 'Page not found'}), 404
         
         data = request.get_json()
@@ -113,26 +128,36 @@ def update_page(page_id):
         if 'content' in data:
             page.content = data['content']
         if 'slug' in data and data['slug'] != page.slug:
+            if data['slug'] in RESERVED_SLUGS:
+                return jsonify({'error': 'Slug is reserved'}), 400
             # スラッグの重複チェック
             existing_page = Page.query.filter_by(slug=data['slug']).first()
             if existing_page and existing_page.id != page.id:
                 return jsonify({'error': 'Slug already exists'}), 400
+            old_slug = page.slug
             page.slug = data['slug']
+            # 旧スラッグへのリンクを新しいスラッグに書き換える
+            rename_slug_links(old_slug, page.slug, request.current_user.id, exclude_page_id=page.id)
+            # 同じリクエストで送られた本文はインデックスにまだないため、直接書き換える
+            page.content = rewrite_links(page.content, old_slug, page.slug)
         if 'is_published' in data:
             page.is_published = data['is_published']
         
         page.updated_at = datetime.utcnow()
         
         # 履歴を保存（コンテンツが変更された場合のみ）
-        if 'content' in data and data['content'] != old_content:
+        if page.content != old_content:
             history = PageHistory(
                 page_id=page.id,
                 content=old_content,  # 変更前のコンテンツを保存
                 author_id=request.current_user.id
             )
             db.session.add(history)
+            sync_page_links(page)
+            sync_page_attachments(page)
         
         db.session.commit()
+        title_index.upsert(page)
         
         return jsonify(page.to_dict())
         
@@ -145,16 +170,72 @@ def update_page(page_id):
 @require_auth
 @require_role('admin')
 def delete_page(page_id):
-    """ページを削除（管理者のみ）"""
+    """ページをゴミ箱に移動（管理者のみ）"""
     try:
         page = Page.query.get(page_id)
-        if not page:
+        if not page or page.deleted_at is not None:
+            return jsonify({'error': 'Page not found'}), 404
+        
+        move_to_trash(page)
+        db.session.commit()
+        title_index.remove(page_id)
+        
+        return jsonify({'message': 'Page moved to trash successfully'})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/trash', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def get_trash():
+    """ゴミ箱のページ一覧を取得（管理者のみ）"""
+    try:
+        pages = Page.query.filter(Page.deleted_at.isnot(None)).order_by(Page.deleted_at.desc()).all()
+        return jsonify([
+            dict(page.to_summary_dict(), deleted_at=page.deleted_at.isoformat())
+            for page in pages
+        ])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/<int:page_id>/restore', methods=['POST'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def restore_trashed_page(page_id):
+    """ゴミ箱からページを復元（管理者のみ）"""
+    try:
+        page = Page.query.get(page_id)
+        if not page or page.deleted_at is None:
+            return jsonify({'error': 'Page not found in trash'}), 404
+        
+        restore_page(page)
+        db.session.commit()
+        title_index.upsert(page)
+        
+        return jsonify(page.to_dict())
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/<int:page_id>/purge', methods=['DELETE'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def purge_page(page_id):
+    """ページを履歴ごと完全に削除（管理者のみ、元に戻せない）"""
+    try:
+        if not purge_pages([page_id]):
             return jsonify({'error': 'Page not found'}), 404
         
-        db.session.delete(page)
         db.session.commit()
+        title_index.remove(page_id)
         
-        return jsonify({'message': 'Page deleted successfully'})
+        return jsonify({'message': 'Page deleted permanently'})
         
     except Exception as e:
         db.session.rollback()
@@ -176,8 +257,81 @@ def get_page_history(page_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@pages_bp.route('/<slug>/backlinks', methods=['GET'])
+@cross_origin()
+def get_page_backlinks(slug):
+    """指定ページにリンクしているページ一覧を取得"""
+    try:
+        pages = get_backlinks(slug)
+        return jsonify([page.to_summary_dict() for page in pages])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/links/broken', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('editor')
+def get_page_broken_links():
+    """存在しないページへのリンク一覧を取得"""
+    try:
+        broken_links = get_broken_links()
+        return jsonify([{
+            'source': page.to_summary_dict(),
+            'target_slug': target_slug
+        } for page, target_slug in broken_links])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/popular', methods=['GET'])
+@cross_origin()
+def get_popular():
+    """直近の閲覧数が多いページを取得"""
+    try:
+        days = min(max(request.args.get('days', 7, type=int), 1), 365)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        
+        popular = get_popular_pages(days=days, limit=limit)
+        return jsonify([
+            dict(page.to_summary_dict(), views=int(views))
+            for page, views in popular
+        ])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/<int:page_id>/views', methods=['GET'])
+@cross_origin()
+@require_auth
+def get_page_views(page_id):
+    """ページの日別閲覧数を取得"""
+    try:
+        page = Page.query.get(page_id)
+        if not page:
+            return jsonify({'error': 'Page not found'}), 404
+        
+        days = min(max(request.args.get('days', 30, type=int), 1), 365)
+        return jsonify([stat.to_dict() for stat in get_daily_views(page_id, days=days)])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pages_bp.route('/suggest', methods=['GET'])
+@cross_origin()
+def suggest_pages():
+    """タイトル・スラッグの前方一致候補を取得（かな・ローマ字入力に対応）"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify([])
+        
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        title_index.ensure_fresh()
+        return jsonify(title_index.suggest(query, limit=limit))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @pages_bp.route('/search', methods=['GET'])
 @cross_origin()
+@rate_limit('search')
 def search_pages():
     """ページを検索"""
     try:
@@ -191,7 +345,7 @@ def search_pages():
                 Page.title.contains(query),
                 Page.content.contains(query)
             ),
-            Page.is_published == True
+            Page.visible()
         ).order_by(Page.updated_at.desc()).limit(20).all()
         
         return jsonify([page.to_dict() for page in pages])
@@ -1,39 +1,113 @@
 from flask import Blueprint, jsonify, request
-from src.models.user import User, db
+from flask_cors import cross_origin
+from src.models.wiki import db, User
+from src.routes.auth import require_auth, require_role
 
 user_bp = Blueprint('user', __name__)
 
-@user_bp.route('/users', methods=['GET'])
+ROLES = ('viewer', 'editor', 'admin')
+
+# 一覧の1ページあたりの件数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+@user_bp.route('', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
-
-@user_bp.route('/users', methods=['POST'])
-def create_user():
-    
-    data = request.json
-    user = User(username=data['username'], email=data['email'])
-    db.session.add(user)
-    db.session.commit()
-    return jsonify(user.to_dict()), 201
-
-@user_bp.route('/users/<int:user_id>', methods=['GET'])
+    """ユーザー一覧を取得（管理者のみ）
+
+    ID順のキーセットページネーション。次のページは next_cursor を after に渡して取得する。
+    role で役割を、q でユーザー名の前方一致を絞り込む。
+    """
+    try:
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        after = request.args.get('after', type=int)
+        role = request.args.get('role')
+        prefix = request.args.get('q', '').strip()
+
+        if role and role not in ROLES:
+            return jsonify({'error': 'Invalid role'}), 400
+
+        query = User.query
+        if after:
+            query = query.filter(User.id > after)
+        if role:
+            query = query.filter(User.role == role)
+        if prefix:
+            # LIKEではインデックスが使われないため範囲条件で前方一致させる
+            query = query.filter(User.username >= prefix, User.username < prefix + '\U0010ffff')
+
+        # 1件多く取得して次のページの有無を判定
+        users = query.order_by(User.id).limit(limit + 1).all()
+        has_more = len(users) > limit
+        users = users[:limit]
+
+        return jsonify({
+            'users': [user.to_dict() for user in users],
+            'next_cursor': users[-1].id if has_more else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/<int:user_id>', methods=['GET'])
+@cross_origin()
+@require_auth
+@require_role('admin')
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
-
-@user_bp.route('/users/<int:user_id>', methods=['PUT'])
-def update_user(user_id):
-    user = User.query.get_or_404(user_id)
-    data = request.json
-    user.username = data.get('username', user.username)
-    user.email = data.get('email', user.email)
-    db.session.commit()
-    return jsonify(user.to_dict())
-
-@user_bp.route('/users/<int:user_id>', methods=['DELETE'])
-def delete_user(user_id):
-    user = User.query.get_or_404(user_id)
-    db.session.delete(user)
-    db.session.commit()
-    return '', 204
+    """特定のユーザーを取得（管理者のみ）"""
+    try:
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        return jsonify(user.to_dict())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/roles', methods=['PUT'])
+@cross_origin()
+@require_auth
+@require_role('admin')
+def update_user_roles():
+    """複数ユーザーの役割を1つのトランザクションで変更（管理者のみ）
+
+    リクエスト: {"user_ids": [1, 2, 3], "role": "editor"}
+    ここで設定した役割は、次回ログイン時に環境変数の役割で上書きされない。
+    """
+    try:
+        data = request.get_json()
+        if not data or not data.get('user_ids') or not data.get('role'):
+            return jsonify({'error': 'user_ids and role are required'}), 400
+
+        role = data['role']
+        if role not in ROLES:
+            return jsonify({'error': 'Invalid role'}), 400
+
+        # 文字列を渡されると1文字ずつIDとして扱われてしまうため、リストに限る
+        if not isinstance(data['user_ids'], list):
+            return jsonify({'error': 'user_ids must be a list of integers'}), 400
+        try:
+            user_ids = {int(user_id) for user_id in data['user_ids']}
+        except (TypeError, ValueError):
+            return jsonify({'error': 'user_ids must be a list of integers'}), 400
+
+        # 自分自身の権限を変更して管理者がいなくなるのを防ぐ
+        if request.current_user.id in user_ids:
+            return jsonify({'error': 'Cannot change your own role'}), 400
+
+        found_ids = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(user_ids))}
+        missing_ids = sorted(user_ids - found_ids)
+        if missing_ids:
+            return jsonify({'error': 'User not found', 'user_ids': missing_ids}), 404
+
+        updated = User.query.filter(User.id.in_(user_ids)).update(
+            {User.role: role, User.role_overridden: True}, synchronize_session=False
+        )
+        db.session.commit()
+
+        return jsonify({'updated': updated, 'role': role})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+
+from src.models.wiki import db, Attachment, PageAttachment
+
+# アップロードを読み書きする単位
+CHUNK_SIZE = 64 * 1024
+
+# 本文中の添付ファイル参照（/api/attachments/<sha256>）
+ATTACHMENT_REF_RE = re.compile(r'/api/attachments/([0-9a-f]{64})')
+
+# 受け付けるファイル形式（先頭のバイト列で判定し、送られてきたContent-Typeは信用しない）
+MAGIC_TYPES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+)
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_SUFFIX = '.thumb.webp'
+
+class AttachmentError(Exception):
+    """添付ファイルの受け付けに失敗（status はHTTPステータス）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _thumbnail_executor():
+    """サムネイル生成用のワーカープール（初回に起動）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config['ATTACHMENT_THUMBNAIL_WORKERS'],
+                thread_name_prefix='attachment-thumbnail'
+            )
+    return _executor
+
+def detect_content_type(head):
+    """ファイル先頭のバイト列から形式を判定（対応外ならNone）"""
+    for magic, content_type in MAGIC_TYPES:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+def storage_path(storage_dir, sha256):
+    """ハッシュの先頭2文字ずつでディレクトリを分けた保存先"""
+    return os.path.join(storage_dir, sha256[:2], sha256[2:4], sha256)
+
+def thumbnail_path(storage_dir, sha256):
+    return storage_path(storage_dir, sha256) + THUMBNAIL_SUFFIX
+
+def _touch(sha256):
+    """既存の添付ファイルの last_uploaded_at を更新してコミット（存在したか）"""
+    touched = Attachment.query.filter_by(sha256=sha256).update(
+        {Attachment.last_uploaded_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    return touched > 0
+
+def save_upload(stream, filename, uploader_id):
+    """アップロードをディスクに書きながらハッシュを計算して保存する
+
+    全体をメモリに読み込まず、CHUNK_SIZE ずつ一時ファイルに書き込む。
+    同じ内容のファイルが既にあれば新しく保存せず既存のレコードを返す。
+    戻り値は (Attachment, 新規作成したか)。
+    """
+    storage_dir = current_app.config['ATTACHMENT_DIR']
+    max_size = current_app.config['ATTACHMENT_MAX_SIZE']
+    tmp_dir = os.path.join(storage_dir, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise AttachmentError('File too large', status=413)
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                f.write(chunk)
+
+        if size == 0:
+            raise AttachmentError('Empty file')
+        content_type = detect_content_type(head)
+        if not content_type:
+            raise AttachmentError('Unsupported file type', status=415)
+
+        sha256 = digest.hexdigest()
+        # 既にあるファイルなら、GCに消されないよう先に猶予期間を数え直してコミットし、
+        # その後でファイルの有無を確認する（GCは削除が終わるまで書き込みロックを持つ）
+        touched = _touch(sha256)
+        path = storage_path(storage_dir, sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    attachment = Attachment.query.filter_by(sha256=sha256).first() if touched else None
+    created = attachment is None
+    if created:
+        attachment = Attachment(
+            sha256=sha256,
+            size=size,
+            content_type=content_type,
+            filename=os.path.basename(filename or '')[:255] or None,
+            uploader_id=uploader_id
+        )
+        db.session.add(attachment)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 同じファイルが同時にアップロードされた場合は先に登録された方を使う
+            db.session.rollback()
+            _touch(sha256)
+            attachment = Attachment.query.filter_by(sha256=sha256).one()
+            created = False
+
+    if content_type.startswith('image/'):
+        schedule_thumbnail(sha256)
+    return attachment, created
+
+def _generate_thumbnail(source, target):
+    """サムネイルを作成（ワーカープールで実行）"""
+    tmp_target = f'{target}.partial'
+    try:
+        with Image.open(source) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            image.save(tmp_target, 'WEBP', quality=80)
+        os.replace(tmp_target, target)
+    finally:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+
+def schedule_thumbnail(sha256):
+    """サムネイルの生成をワーカープールに登録（作成済みなら何もしない）"""
+    storage_dir = current_app.config['ATTACHMENT_DIR']
+    target = thumbnail_path(storage_dir, sha256)
+    if os.path.exists(target):
+        return None
+
+    logger = current_app.logger
+
+    def task():
+        try:
+            _generate_thumbnail(storage_path(storage_dir, sha256), target)
+        except Exception as e:
+            logger.warning('Failed to generate thumbnail for %s: %s', sha256, e)
+
+    return _thumbnail_executor().submit(task)
+
+def sync_page_attachments(page):
+    """本文から参照されている添付ファイルをページに紐付ける（コミットは呼び出し側）"""
+    if page.id is None:
+        db.session.flush()
+
+    referenced = set(ATTACHMENT_REF_RE.findall(page.content or ''))
+    attachment_ids = {
+        attachment_id for (attachment_id,) in
+        db.session.query(Attachment.id).filter(Attachment.sha256.in_(referenced))
+    } if referenced else set()
+    existing = {
+        attachment_id for (attachment_id,) in
+        db.session.query(PageAttachment.attachment_id).filter_by(page_id=page.id)
+    }
+
+    removed = existing - attachment_ids
+    if removed:
+        PageAttachment.query.filter(
+            PageAttachment.page_id == page.id,
+            PageAttachment.attachment_id.in_(removed)
+        ).delete(synchronize_session=False)
+    for attachment_id in attachment_ids - existing:
+        db.session.add(PageAttachment(page_id=page.id, attachment_id=attachment_id))
+
+def collect_garbage(grace_hours=24):
+    """どのページからも参照されていない添付ファイルを削除する
+
+    アップロード直後でまだページに保存されていないファイルを消さないよう、
+    grace_hours 以内に（再）アップロードされたものは残す。参照は各ページの現在の本文のみで
+    判定するため、過去の履歴にしか残っていない画像は削除される。
+    """
+    storage_dir = current_app.config['ATTACHMENT_DIR']
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    last_uploaded_at = db.func.coalesce(Attachment.last_uploaded_at, Attachment.created_at)
+    is_orphan = db.and_(
+        last_uploaded_at < cutoff,
+        ~db.exists().where(PageAttachment.attachment_id == Attachment.id)
+    )
+    candidates = db.session.query(Attachment.id, Attachment.sha256).filter(is_orphan).all()
+
+    removed = 0
+    freed = 0
+    for attachment_id, sha256 in candidates:
+        # 一覧を取得した後に再アップロード・参照された場合は削除しない。
+        # ファイルの削除が終わるまでコミットせず、同じファイルのアップロードを待たせる
+        deleted = Attachment.query.filter(Attachment.id == attachment_id, is_orphan).delete(synchronize_session=False)
+        if deleted:
+            removed += 1
+            for path in (storage_path(storage_dir, sha256), thumbnail_path(storage_dir, sha256)):
+                if os.path.exists(path):
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        db.session.commit()
+    return {'removed': removed, 'freed_bytes': freed}
@@ -0,0 +1,242 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from src.models.wiki import db
+
+BACKUP_PREFIX = 'app-'
+BACKUP_SUFFIXES = ('.db', '.db.gz')
+
+# オンラインバックアップの1ステップでコピーするページ数と、ステップ間の待ち時間
+PAGES_PER_STEP = 1024
+STEP_SLEEP = 0.01
+
+# コピー中に書き込みがあるとSQLiteはバックアップを最初からやり直す。
+# この回数を超えたら、残りを1ステップでコピーする（その間だけ書き込みを待たせる）
+MAX_RESTARTS = 3
+
+class BackupError(Exception):
+    """バックアップ・リストアの失敗"""
+
+class _TooManyRestarts(Exception):
+    pass
+
+def database_path():
+    """接続中のSQLiteデータベースファイルのパス"""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise BackupError('Online backup is only supported for file-based SQLite databases')
+    return url.database
+
+def _copy_online(source_path, target_path, pages_per_step=PAGES_PER_STEP, step_sleep=STEP_SLEEP):
+    """SQLiteのオンラインバックアップAPIで数ページずつコピーする
+
+    ステップの合間は読み取りロックを解放するので、書き込みは長く待たされない。
+    """
+    stats = {'steps': 0, 'restarts': 0, 'pages': 0}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats['steps'] += 1
+        stats['pages'] = total
+        if last_remaining is not None and remaining > last_remaining:
+            stats['restarts'] += 1
+            if stats['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        except _TooManyRestarts:
+            # 書き込みが多くて追いつかない場合は一括でコピーし直す
+            source.backup(target, pages=-1)
+            stats['fallback'] = True
+    finally:
+        target.close()
+        source.close()
+    return stats
+
+def check_integrity(path):
+    """データベースファイルの整合性を検査（問題がなければ 'ok'）"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = connection.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        connection.close()
+    return '; '.join(row[0] for row in rows)
+
+def create_backup(backup_dir, compress=True, pages_per_step=PAGES_PER_STEP, step_sleep=STEP_SLEEP):
+    """稼働中のデータベースをバックアップし、整合性を検査してから保存する"""
+    source_path = database_path()
+    os.makedirs(backup_dir, exist_ok=True)
+
+    name = f"{BACKUP_PREFIX}{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.db"
+    partial_path = os.path.join(backup_dir, f'{name}.partial')
+    timings = {}
+
+    try:
+        started = time.perf_counter()
+        stats = _copy_online(source_path, partial_path, pages_per_step, step_sleep)
+        timings['copy_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        integrity = check_integrity(partial_path)
+        timings['verify_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if integrity != 'ok':
+            raise BackupError(f'Integrity check failed: {integrity}')
+
+        started = time.perf_counter()
+        if compress:
+            name = f'{name}.gz'
+            with open(partial_path, 'rb') as src, gzip.open(os.path.join(backup_dir, f'{name}.partial'), 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(partial_path)
+            partial_path = os.path.join(backup_dir, f'{name}.partial')
+        os.replace(partial_path, os.path.join(backup_dir, name))
+        timings['compress_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    return dict(
+        stats,
+        name=name,
+        size=os.path.getsize(os.path.join(backup_dir, name)),
+        source_size=os.path.getsize(source_path),
+        compressed=compress,
+        **timings
+    )
+
+def list_backups(backup_dir):
+    """バックアップファイルを新しい順に返す"""
+    if not os.path.isdir(backup_dir):
+        return []
+    backups = []
+    for name in os.listdir(backup_dir):
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES):
+            path = os.path.join(backup_dir, name)
+            backups.append({
+                'name': name,
+                'size': os.path.getsize(path),
+                'created_at': datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+    backups.sort(key=lambda backup: backup['name'], reverse=True)
+    return backups
+
+def rotate_backups(backup_dir, keep):
+    """新しいものから keep 件を残して古いバックアップを削除"""
+    removed = []
+    for backup in list_backups(backup_dir)[keep:]:
+        os.remove(os.path.join(backup_dir, backup['name']))
+        removed.append(backup['name'])
+    return removed
+
+def resolve_backup(backup_dir, name):
+    """バックアップ名をパスに変換（ディレクトリ外を指す名前は拒否）"""
+    if os.path.basename(name) != name or not name.startswith(BACKUP_PREFIX) or not name.endswith(BACKUP_SUFFIXES):
+        raise BackupError('Invalid backup name')
+    path = os.path.join(backup_dir, name)
+    if not os.path.isfile(path):
+        raise BackupError('Backup not found')
+    return path
+
+def _open_plain_copy(path):
+    """圧縮されたバックアップは一時ファイルに展開し、(パス, 一時ファイルか) を返す"""
+    if not path.endswith('.gz'):
+        return path, False
+    fd, plain_path = tempfile.mkstemp(suffix='.db')
+    with os.fdopen(fd, 'wb') as dst, gzip.open(path, 'rb') as src:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return plain_path, True
+
+def verify_backup(path):
+    """バックアップファイルを展開して整合性を検査"""
+    plain_path, is_temporary = _open_plain_copy(path)
+    try:
+        return check_integrity(plain_path)
+    finally:
+        if is_temporary:
+            os.remove(plain_path)
+
+def restore_backup(path, backup_dir=None):
+    """バックアップから稼働中のデータベースを復元する
+
+    復元前に整合性を検査し、backup_dir が指定されていれば現在の状態を
+    先にバックアップする。書き込みはSQLiteのバックアップAPIで1ステップで
+    行うため、他の接続からは復元前か復元後のどちらかの状態しか見えない。
+    """
+    target_path = database_path()
+    plain_path, is_temporary = _open_plain_copy(path)
+    try:
+        integrity = check_integrity(plain_path)
+        if integrity != 'ok':
+            raise BackupError(f'Integrity check failed: {integrity}')
+
+        safety_backup = create_backup(backup_dir) if backup_dir else None
+
+        started = time.perf_counter()
+        source = sqlite3.connect(plain_path)
+        target = sqlite3.connect(target_path, timeout=30)
+        try:
+            source.backup(target, pages=-1)
+        finally:
+            target.close()
+            source.close()
+        restore_ms = round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        if is_temporary:
+            os.remove(plain_path)
+
+    # プール済みの接続を破棄して復元後のデータを読ませる
+    db.engine.dispose()
+    return {
+        'restored_from': os.path.basename(path),
+        'safety_backup': safety_backup['name'] if safety_backup else None,
+        'restore_ms': restore_ms
+    }
+
+class BackupScheduler:
+    """BACKUP_INTERVAL_HOURS ごとにバックアップとローテーションを行うスレッド
+
+    複数ワーカーで起動しても、最新のバックアップが間隔より新しければ
+    何もしないので、重複して作成されることはほぼない。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['BACKUP_INTERVAL_HOURS'] * 3600
+        self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _is_due(self, backup_dir):
+        backups = list_backups(backup_dir)
+        if not backups:
+            return True
+        newest = os.path.getmtime(os.path.join(backup_dir, backups[0]['name']))
+        return time.time() - newest >= self.interval
+
+    def _run(self):
+        while True:
+            backup_dir = self.app.config['BACKUP_DIR']
+            try:
+                if self._is_due(backup_dir):
+                    with self.app.app_context():
+                        result = create_backup(backup_dir)
+                    rotate_backups(backup_dir, self.app.config['BACKUP_KEEP'])
+                    self.app.logger.info('Scheduled backup created: %s', result['name'])
+            except Exception as e:
+                self.app.logger.warning('Scheduled backup failed: %s', e)
+            time.sleep(min(self.interval, 600))
@@ -0,0 +1,149 @@
+import re
+from datetime import datetime
+
+from src.models.wiki import db, Page, PageHistory, PageLink
+
+# Markdownリンク: [テキスト](slug) / [テキスト](/slug) / [テキスト](/pages/slug#見出し)
+MARKDOWN_LINK_RE = re.compile(r'(?<!!)(\[[^\]]*\]\()(/?(?:pages/)?)([\w-]+)(#[^)\s]*)?(\s+"[^"]*")?\)')
+
+# Wikiリンク: [[slug]] / [[slug|テキスト]] / [[slug#見出し]]
+WIKI_LINK_RE = re.compile(r'\[\[([\w-]+)(#[^\]|]*)?(\|[^\]]*)?\]\]')
+
+# 一括再構築時に一度に読み込むページ数
+REBUILD_BATCH_SIZE = 200
+
+def extract_link_slugs(content):
+    """本文から内部リンク先のスラッグを抽出"""
+    if not content:
+        return set()
+    slugs = {match.group(3) for match in MARKDOWN_LINK_RE.finditer(content)}
+    slugs.update(match.group(1) for match in WIKI_LINK_RE.finditer(content))
+    return slugs
+
+def rewrite_links(content, old_slug, new_slug):
+    """本文中の old_slug へのリンクを new_slug に書き換える（記法はそのまま）"""
+    if not content:
+        return content
+
+    def replace_markdown(match):
+        if match.group(3) != old_slug:
+            return match.group(0)
+        return ''.join([
+            match.group(1), match.group(2), new_slug,
+            match.group(4) or '', match.group(5) or '', ')'
+        ])
+
+    def replace_wiki(match):
+        if match.group(1) != old_slug:
+            return match.group(0)
+        return f"[[{new_slug}{match.group(2) or ''}{match.group(3) or ''}]]"
+
+    content = MARKDOWN_LINK_RE.sub(replace_markdown, content)
+    return WIKI_LINK_RE.sub(replace_wiki, content)
+
+def sync_page_links(page):
+    """ページのリンクインデックスを本文に合わせて更新（コミットは呼び出し側）"""
+    if page.id is None:
+        db.session.flush()
+
+    slugs = extract_link_slugs(page.content)
+    existing = {
+        target_slug for (target_slug,) in
+        db.session.query(PageLink.target_slug).filter_by(source_page_id=page.id)
+    }
+
+    removed = existing - slugs
+    if removed:
+        PageLink.query.filter(
+            PageLink.source_page_id == page.id,
+            PageLink.target_slug.in_(removed)
+        ).delete(synchronize_session=False)
+
+    for slug in slugs - existing:
+        db.session.add(PageLink(source_page_id=page.id, target_slug=slug))
+
+def rename_slug_links(old_slug, new_slug, author_id, exclude_page_id=None):
+    """スラッグ変更時にリンク元ページの本文とインデックスを書き換える
+
+    書き換えたページには変更前の本文を履歴として残す。exclude_page_id の
+    ページは本文だけ書き換え、履歴の保存は呼び出し側に任せる。
+    """
+    source_ids = [
+        source_page_id for (source_page_id,) in
+        db.session.query(PageLink.source_page_id).filter_by(target_slug=old_slug)
+    ]
+    if not source_ids:
+        return []
+
+    now = datetime.utcnow()
+    rewritten = []
+    for page in Page.query.filter(Page.id.in_(source_ids)).all():
+        new_content = rewrite_links(page.content, old_slug, new_slug)
+        if new_content == page.content:
+            continue
+        if page.id != exclude_page_id:
+            db.session.add(PageHistory(page_id=page.id, content=page.content, author_id=author_id))
+            page.updated_at = now
+        page.content = new_content
+        rewritten.append(page)
+
+    # 新しいスラッグへのリンクを既に持っているページとの重複を避ける
+    already_linked = {
+        source_page_id for (source_page_id,) in
+        db.session.query(PageLink.source_page_id).filter(
+            PageLink.target_slug == new_slug,
+            PageLink.source_page_id.in_(source_ids)
+        )
+    }
+    if already_linked:
+        PageLink.query.filter(
+            PageLink.target_slug == old_slug,
+            PageLink.source_page_id.in_(already_linked)
+        ).delete(synchronize_session=False)
+    PageLink.query.filter_by(target_slug=old_slug).update(
+        {PageLink.target_slug: new_slug}, synchronize_session=False
+    )
+    return rewritten
+
+def get_backlinks(slug):
+    """指定スラッグにリンクしている公開ページ"""
+    return Page.query.join(PageLink, PageLink.source_page_id == Page.id).filter(
+        PageLink.target_slug == slug,
+        Page.visible()
+    ).order_by(Page.title).all()
+
+def get_broken_links():
+    """存在しない（またはゴミ箱にある）ページへのリンクを (リンク元ページ, リンク先スラッグ) で返す"""
+    target = db.aliased(Page)
+    return db.session.query(Page, PageLink.target_slug).join(
+        PageLink, PageLink.source_page_id == Page.id
+    ).outerjoin(
+        target, db.and_(target.slug == PageLink.target_slug, target.deleted_at.is_(None))
+    ).filter(
+        target.id.is_(None),
+        Page.deleted_at.is_(None)
+    ).order_by(Page.id, PageLink.target_slug).all()
+
+def rebuild_links():
+    """全ページのリンクインデックスを作り直す"""
+    PageLink.query.delete(synchronize_session=False)
+
+    link_count = 0
+    page_count = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Page.id, Page.content).filter(
+            Page.id > last_id
+        ).order_by(Page.id).limit(REBUILD_BATCH_SIZE).all()
+        if not rows:
+            break
+        for page_id, content in rows:
+            slugs = extract_link_slugs(content)
+            db.session.add_all(PageLink(source_page_id=page_id, target_slug=slug) for slug in slugs)
+            link_count += len(slugs)
+        page_count += len(rows)
+        last_id = rows[-1][0]
+        db.session.flush()
+
+    db.session.commit()
+    return {'pages': page_count, 'links': link_count}
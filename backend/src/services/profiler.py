@@ -0,0 +1,261 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# プロファイル方式
+MODE_SAMPLE = 'sample'      # スタックサンプリング（低オーバーヘッド、collapsed stacks）
+MODE_CPROFILE = 'cprofile'  # cProfile（関数単位の正確な集計、pstats）
+MODES = (MODE_SAMPLE, MODE_CPROFILE)
+
+# このヘッダーを付けた管理者のリクエストは必ずプロファイルする（値で方式を指定）
+PROFILE_HEADER = 'X-Profile'
+
+# cProfileはプロセス内で同時に1つしか有効にできない（Python 3.12以降は
+# enable() が ValueError になり、全スレッドの呼び出しを集計する）ため、
+# 実行中の場合はそのリクエストをサンプリング方式でプロファイルする
+_cprofile_lock = threading.Lock()
+
+class StackSampler(threading.Thread):
+    """指定スレッドのスタックを一定間隔で採取し、collapsed stacks形式で集計する"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        """flamegraph.pl / speedscope で読める形式"""
+        return '\n'.join(f'{stack} {count}' for stack, count in self.counts.most_common())
+
+class ProfileStore:
+    """プロファイル結果をプロセス内に新しい順で一定件数だけ保持する"""
+
+    def __init__(self, max_records):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.appendleft(record)
+
+    def get(self, profile_id):
+        with self._lock:
+            for record in self._records:
+                if record['id'] == profile_id:
+                    return record
+        return None
+
+    def list(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+def summarize(record):
+    """API用の要約（プロファイル本体は含まない）"""
+    return {key: value for key, value in record.items() if key not in ('stats', 'collapsed')}
+
+def top_functions(record, limit=30):
+    """cProfileの結果から累積時間の大きい関数を返す"""
+    if not record.get('stats'):
+        return []
+    stats = pstats.Stats(_StatsLoader(record['stats']), stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            'function': f'{name} ({os.path.basename(filename)}:{line})',
+            'calls': nc,
+            'primitive_calls': cc,
+            'total_ms': round(tt * 1000, 3),
+            'cumulative_ms': round(ct * 1000, 3)
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+class _StatsLoader:
+    """marshal済みの統計をpstats.Statsに渡すためのラッパー"""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+class RequestProfiler:
+    """リクエスト単位のプロファイラ
+
+    PROFILE_SAMPLE_RATE の割合でリクエストを抽出するか、管理者が
+    X-Profile ヘッダーを付けたリクエストだけをプロファイルする。
+    対象外のリクエストでは乱数1回とヘッダー参照しか行わない。
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.getenv('PROFILE_SAMPLE_RATE', '0')))
+        app.config.setdefault('PROFILE_MODE', os.getenv('PROFILE_MODE', MODE_SAMPLE))
+        app.config.setdefault('PROFILE_SAMPLE_INTERVAL_MS', float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '2')))
+        app.config.setdefault('PROFILE_MAX_RECORDS', int(os.getenv('PROFILE_MAX_RECORDS', '100')))
+
+        self.store = ProfileStore(app.config['PROFILE_MAX_RECORDS'])
+        app.extensions['request_profiler'] = self
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        # SQLの実行時間を集計（プロファイル中のリクエストのみ）
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _select_mode(self, app_config):
+        """このリクエストをプロファイルするか判定し、方式を返す"""
+        header_mode = request.headers.get(PROFILE_HEADER)
+        if header_mode is not None:
+            from src.routes.auth import get_user_from_request
+
+            user = get_user_from_request()
+            if user and user.role == 'admin':
+                return header_mode if header_mode in MODES else app_config['PROFILE_MODE']
+            return None
+
+        sample_rate = app_config['PROFILE_SAMPLE_RATE']
+        if sample_rate > 0 and random.random() < sample_rate:
+            return app_config['PROFILE_MODE']
+        return None
+
+    def _before_request(self):
+        # プロファイルAPI自体と静的ファイルは対象外
+        if not request.path.startswith('/api/') or request.path.startswith('/api/admin/profiles'):
+            return None
+
+        mode = self._select_mode(current_app.config)
+        if mode is None:
+            return None
+
+        state = {'mode': mode, 'sql_count': 0, 'sql_time': 0.0}
+        if mode == MODE_CPROFILE:
+            profiler = _start_cprofile()
+            if profiler is not None:
+                state['profiler'] = profiler
+            else:
+                state['mode'] = mode = MODE_SAMPLE
+        if mode == MODE_SAMPLE:
+            interval = current_app.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000
+            state['sampler'] = StackSampler(threading.get_ident(), interval)
+            state['sampler'].start()
+        state['started'] = time.perf_counter()
+        g._profile = state
+        return None
+
+    def _after_request(self, response):
+        state = g.pop('_profile', None)
+        if state is None:
+            return response
+
+        duration = time.perf_counter() - state['started']
+        record = {
+            'id': uuid.uuid4().hex[:12],
+            'mode': state['mode'],
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'sql_count': state['sql_count'],
+            'sql_ms': round(state['sql_time'] * 1000, 3),
+            'created_at': datetime.utcnow().isoformat(),
+            'stats': None,
+            'collapsed': None
+        }
+        if state['mode'] == MODE_CPROFILE:
+            profiler = state['profiler']
+            _stop_cprofile(profiler)
+            profiler.create_stats()
+            record['stats'] = marshal.dumps(profiler.stats)
+        else:
+            sampler = state['sampler']
+            sampler.stop()
+            record['samples'] = sum(sampler.counts.values())
+            record['collapsed'] = sampler.collapsed()
+
+        self.store.add(record)
+        response.headers['X-Profile-Id'] = record['id']
+        return response
+
+    def _teardown_request(self, exc):
+        # 例外で after_request が呼ばれなかった場合の後始末
+        state = g.pop('_profile', None)
+        if state is None:
+            return
+        if 'profiler' in state:
+            _stop_cprofile(state['profiler'])
+        if 'sampler' in state:
+            state['sampler'].stop()
+
+def _start_cprofile():
+    """cProfileを開始（他のリクエスト・他のツールが使用中ならNone）"""
+    if not _cprofile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # デバッガなど、別のプロファイラが動作している
+        _cprofile_lock.release()
+        return None
+    return profiler
+
+def _stop_cprofile(profiler):
+    profiler.disable()
+    _cprofile_lock.release()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_profile' in g:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_profile' in g:
+        starts = conn.info.get('profile_query_start')
+        if starts:
+            g._profile['sql_time'] += time.perf_counter() - starts.pop()
+            g._profile['sql_count'] += 1
+
+def get_profiler():
+    """アプリに登録されたプロファイラを返す"""
+    return current_app.extensions['request_profiler']
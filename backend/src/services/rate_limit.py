@@ -0,0 +1,311 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# 制限の単位（"30/minute" のように指定する）
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# 既定の制限。ログイン済みのリクエストは user、それ以外は ip のバケットで数える。
+# 検索はヘッダーの検索ボックスから入力のたびに呼ばれ、NAT配下の閲覧者は
+# 同じIPのバケットを共有するので、連続した入力を吸収できる容量にしておく
+DEFAULT_LIMITS = {
+    'search': {'ip': '120/minute', 'user': '240/minute'},
+    'login': {'ip': '10/minute'},
+    'write': {'ip': '60/minute', 'user': '60/minute'},
+}
+
+# ブループリント単位の制限（書き込み系のメソッドのみ対象）
+DEFAULT_BLUEPRINT_LIMITS = {
+    'pages': 'write',
+    'menus': 'write',
+    'user': 'write',
+    'attachments': 'write',
+}
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# 満タンに戻ったバケットを削除する間隔（秒）
+PRUNE_INTERVAL = 60
+
+# 拒否回数を記録するキーの上限（超えたら少ないものから捨てる）
+MAX_TRACKED_KEYS = 1000
+
+def parse_limit(value):
+    """"30/minute" を (バケットの容量, 1秒あたりの補充量) に変換"""
+    try:
+        count, period = value.split('/', 1)
+        count = int(count)
+        seconds = PERIODS[period.strip()]
+    except (AttributeError, KeyError, ValueError):
+        raise ValueError(f'Invalid rate limit: {value!r}')
+    if count <= 0:
+        raise ValueError(f'Invalid rate limit: {value!r}')
+    return count, count / seconds
+
+def _consume(state, now, capacity, refill_rate):
+    """トークンを1つ取り出す
+
+    state は (残りトークン, 最終更新時刻) か、初めてのキーならNone。
+    (新しい残りトークン, 待つべき秒数) を返し、待つべき秒数が0なら許可。
+    """
+    if state is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, state[0] + max(0.0, now - state[1]) * refill_rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill_rate
+
+class MemoryBackend:
+    """ワーカープロセス内のバケット（ワーカーごとに別々に数える）"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, retry_after = _consume(self._buckets.get(key), now, capacity, refill_rate)
+            self._buckets[key] = (tokens, now)
+        return retry_after
+
+    def prune(self, max_idle):
+        """max_idle 秒以上使われていない（満タンに戻った）バケットを削除"""
+        cutoff = time.monotonic() - max_idle
+        with self._lock:
+            stale = [key for key, (_, updated) in self._buckets.items() if updated < cutoff]
+            for key in stale:
+                del self._buckets[key]
+
+class SQLiteBackend:
+    """SQLiteファイルで全ワーカーがバケットを共有する
+
+    アプリのデータベースとは別のファイルを使うため、ページの書き込みとは
+    ロックを取り合わない。BEGIN IMMEDIATE で読み取りと更新の間に
+    他のワーカーが割り込まないようにする。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        """スレッドごとの接続（fork後のワーカーでは接続し直す）"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, capacity, refill_rate):
+        # ワーカー間で比較するため、単調時計ではなく壁時計を使う
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            state = connection.execute(
+                'SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, retry_after = _consume(state, now, capacity, refill_rate)
+            connection.execute(
+                'INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return retry_after
+
+    def prune(self, max_idle):
+        self._connection().execute(
+            'DELETE FROM rate_limit_buckets WHERE updated_at < ?', (time.time() - max_idle,)
+        )
+
+class RateLimitMetrics:
+    """拒否したリクエストの集計（このワーカープロセス分）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = datetime.utcnow()
+            self.allowed = Counter()
+            self.rejected = Counter()
+            self.rejected_keys = Counter()
+            self.backend_errors = 0
+
+    def record(self, scope, kind, key, retry_after):
+        with self._lock:
+            if not retry_after:
+                self.allowed[scope] += 1
+                return
+            self.rejected[(scope, kind)] += 1
+            self.rejected_keys[key] += 1
+            if len(self.rejected_keys) > MAX_TRACKED_KEYS:
+                self.rejected_keys = Counter(dict(self.rejected_keys.most_common(MAX_TRACKED_KEYS // 2)))
+
+    def record_error(self):
+        with self._lock:
+            self.backend_errors += 1
+
+    def to_dict(self, top=20):
+        with self._lock:
+            rejected = {}
+            for (scope, kind), count in self.rejected.items():
+                rejected.setdefault(scope, {})[kind] = count
+            return {
+                'since': self.since.isoformat(),
+                'allowed': dict(self.allowed),
+                'rejected': rejected,
+                'top_rejected_keys': [
+                    {'key': key, 'rejected': count} for key, count in self.rejected_keys.most_common(top)
+                ],
+                'backend_errors': self.backend_errors
+            }
+
+class RateLimiter:
+    """トークンバケット方式のレート制限
+
+    ルートごとに @rate_limit('<scope>') で指定するか、RATE_LIMIT_BLUEPRINTS で
+    ブループリントの書き込み系リクエストをまとめて制限する。各スコープの制限は
+    RATE_LIMITS で ip / user ごとに設定する。ログイン済みのリクエストは
+    ユーザー単位で数えるため、同じIPアドレスの利用者同士で枠を奪い合わない。
+
+    バックエンドの障害時はリクエストを拒否せずに通し、backend_errors に数える。
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.metrics = RateLimitMetrics()
+        self._max_idle = 0
+        self._last_prune = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_ENABLED', os.getenv('RATE_LIMIT_ENABLED', '1') != '0')
+        app.config.setdefault('RATE_LIMIT_BACKEND', os.getenv('RATE_LIMIT_BACKEND', 'memory'))
+        app.config.setdefault('RATE_LIMIT_DB', os.getenv(
+            'RATE_LIMIT_DB', os.path.join(app.root_path, 'database', 'ratelimit.db')
+        ))
+        limits = {scope: dict(scope_limits) for scope, scope_limits in DEFAULT_LIMITS.items()}
+        # RATE_LIMITS='{"search": {"ip": "10/minute"}}' のようにJSONで上書きできる
+        for scope, scope_limits in json.loads(os.getenv('RATE_LIMITS', '{}')).items():
+            limits.setdefault(scope, {}).update(scope_limits)
+        app.config.setdefault('RATE_LIMITS', limits)
+        app.config.setdefault('RATE_LIMIT_BLUEPRINTS', dict(DEFAULT_BLUEPRINT_LIMITS))
+
+        # 設定の誤りは起動時に検出する
+        for scope_limits in app.config['RATE_LIMITS'].values():
+            for value in scope_limits.values():
+                capacity, refill_rate = parse_limit(value)
+                self._max_idle = max(self._max_idle, capacity / refill_rate)
+
+        if app.config['RATE_LIMIT_BACKEND'] == SQLiteBackend.name:
+            self.backend = SQLiteBackend(app.config['RATE_LIMIT_DB'])
+        elif app.config['RATE_LIMIT_BACKEND'] == MemoryBackend.name:
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {app.config['RATE_LIMIT_BACKEND']}")
+
+        app.extensions['rate_limiter'] = self
+        app.before_request(self._before_request)
+
+    def _identify(self, scope_limits):
+        """(種類, キー) を返す（ログイン済みで user の制限があればユーザー単位）"""
+        from src.routes.auth import get_token_user_id
+
+        if 'user' in scope_limits:
+            user_id = get_token_user_id()
+            if user_id:
+                return 'user', f'user:{user_id}'
+        return 'ip', f'ip:{request.remote_addr}'
+
+    def check(self, scope):
+        """リクエストを1件数え、制限を超えていれば429のレスポンスを返す"""
+        config = current_app.config
+        if not config['RATE_LIMIT_ENABLED'] or request.method == 'OPTIONS':
+            return None
+
+        scope_limits = config['RATE_LIMITS'].get(scope)
+        if not scope_limits:
+            return None
+        kind, key = self._identify(scope_limits)
+        if kind not in scope_limits:
+            return None
+        capacity, refill_rate = parse_limit(scope_limits[kind])
+
+        try:
+            retry_after = self.backend.take(f'{scope}:{key}', capacity, refill_rate)
+            self._maybe_prune()
+        except Exception as e:
+            current_app.logger.warning('Rate limit backend failed: %s', e)
+            self.metrics.record_error()
+            return None
+
+        self.metrics.record(scope, kind, key, retry_after)
+        if not retry_after:
+            return None
+
+        seconds = max(1, math.ceil(retry_after))
+        response = jsonify({'error': 'Too many requests', 'retry_after': seconds})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(seconds)
+        return response
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        self.backend.prune(self._max_idle)
+
+    def _before_request(self):
+        if request.method not in WRITE_METHODS or not request.blueprint:
+            return None
+        scope = current_app.config['RATE_LIMIT_BLUEPRINTS'].get(request.blueprint)
+        return self.check(scope) if scope else None
+
+def get_rate_limiter():
+    """アプリに登録されたRateLimiterを返す"""
+    return current_app.extensions['rate_limiter']
+
+def rate_limit(scope):
+    """ルート単位でレート制限をかけるデコレータ"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            response = limiter.check(scope) if limiter else None
+            if response is not None:
+                return response
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,272 @@
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import markdown
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+from markdown.util import AMP_SUBSTITUTE
+from sqlalchemy.orm import defer, joinedload
+
+from src.models.wiki import db, Page, Menu
+
+MANIFEST_NAME = 'manifest.json'
+# HTMLの生成方法を変えたら上げる（前回の出力を使わずにすべて再生成される）
+MANIFEST_VERSION = 2
+
+# 検索インデックスは page.id // SEARCH_SHARD_SIZE ごとに分割する
+SEARCH_SHARD_SIZE = 100
+
+# 一度に読み込むページ数（IN句の上限対策）
+LOAD_BATCH_SIZE = 500
+
+# エクスポーターが生成したファイル名（<name>.<hash>.<ext>）
+HASHED_FILE_RE = re.compile(r'\.[0-9a-f]{16}\.(json|html)$')
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title}</title>
+</head>
+<body>
+<article>
+{body}
+</article>
+</body>
+</html>
+"""
+
+def _dump_json(obj):
+    """ハッシュが安定するように整形したJSONバイト列"""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def _safe_name(slug):
+    """スラッグをファイル名として安全な形に変換"""
+    return re.sub(r'[^\w-]', '_', slug) or '_'
+
+def _write_hashed(output_dir, subdir, name, ext, data):
+    """内容ハッシュ付きのファイル名で書き出し、相対パスを返す"""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    filename = f'{name}.{digest}.{ext}'
+    rel_path = f'{subdir}/{filename}' if subdir else filename
+    path = os.path.join(output_dir, rel_path)
+
+    # 同じ内容のファイルが既にあれば書き込まない
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return rel_path
+
+# 出力HTMLに残してよい属性と、リンク・画像に使えるURLスキーム
+ALLOWED_ATTRIBUTES = {'href', 'src', 'alt', 'title', 'id', 'class', 'align', 'colspan', 'rowspan', 'start'}
+ALLOWED_URL_SCHEMES = {'http', 'https', 'mailto'}
+URL_ATTRIBUTES = ('href', 'src')
+
+# スナップショットはアプリと同じオリジンで配信するため、スクリプトを一切実行させない
+SNAPSHOT_CSP = "default-src 'none'; img-src 'self' https: data:; style-src 'unsafe-inline'; base-uri 'none'; form-action 'none'; frame-ancestors 'none'"
+
+def _is_safe_url(url):
+    """相対URLか、許可したスキームのURLか"""
+    # 文字参照はブラウザが展開し、スキーム中の空白・制御文字は無視されるので、同じように正規化して判定する
+    url = html.unescape(url.replace(AMP_SUBSTITUTE, '&'))
+    normalized = re.sub(r'[\x00-\x20]', '', url).lower()
+    scheme, sep, _ = normalized.partition(':')
+    if not sep or re.search(r'[/?#]', scheme):
+        return True
+    return scheme in ALLOWED_URL_SCHEMES
+
+class _SanitizeTreeprocessor(Treeprocessor):
+    """許可していない属性と危険なURLを取り除く（attr_list などの後に実行）"""
+
+    def run(self, root):
+        for element in root.iter():
+            for name in list(element.attrib):
+                if name not in ALLOWED_ATTRIBUTES:
+                    del element.attrib[name]
+                elif name in URL_ATTRIBUTES and not _is_safe_url(element.attrib[name]):
+                    del element.attrib[name]
+
+class _SafeHtmlExtension(Extension):
+    """本文中の生のHTMLをタグとして出力せず、テキストとしてエスケープする
+
+    編集者が書いた <script> や onerror 属性がスナップショットで実行されると、
+    同じオリジンの localStorage にあるトークンを盗めてしまう。
+    """
+
+    def extendMarkdown(self, md):
+        md.preprocessors.deregister('html_block')
+        md.inlinePatterns.deregister('html')
+        md.treeprocessors.register(_SanitizeTreeprocessor(md), 'sanitize', 0)
+
+def render_page_html(page):
+    """ページのMarkdownをHTMLに変換（生のHTMLはエスケープする）"""
+    body = markdown.markdown(page.content or '', extensions=['extra', 'sane_lists', _SafeHtmlExtension()])
+    return HTML_TEMPLATE.format(title=html.escape(page.title), body=body)
+
+def _plain_text(content):
+    """検索インデックス用にMarkdown記法を取り除く"""
+    text = re.sub(r'```.*?```', ' ', content or '', flags=re.S)
+    text = re.sub(r'!?\[([^\]]*)\]\([^)]*\)', r'\1', text)
+    text = re.sub(r'[#>*_`~|-]+', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def load_manifest(output_dir):
+    """前回のマニフェストを読み込む（存在しない場合は空）"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+def _load_pages(page_ids):
+    """ページ本体を分割して読み込む"""
+    page_ids = list(page_ids)
+    for start in range(0, len(page_ids), LOAD_BATCH_SIZE):
+        batch = page_ids[start:start + LOAD_BATCH_SIZE]
+        yield from Page.query.options(joinedload(Page.author)).filter(Page.id.in_(batch)).all()
+
+def _export_search_shard(output_dir, shard):
+    """指定シャードに属する公開ページの検索インデックスを書き出す"""
+    pages = Page.query.filter(
+        Page.visible(),
+        Page.id >= shard * SEARCH_SHARD_SIZE,
+        Page.id < (shard + 1) * SEARCH_SHARD_SIZE
+    ).order_by(Page.id).all()
+    if not pages:
+        return None
+
+    entries = [{
+        'id': page.id,
+        'slug': page.slug,
+        'title': page.title,
+        'text': _plain_text(page.content)
+    } for page in pages]
+    return _write_hashed(output_dir, 'search', f'shard-{shard:05d}', 'json', _dump_json(entries))
+
+def _prune(output_dir, referenced):
+    """マニフェストから参照されなくなった生成ファイルを削除"""
+    removed = 0
+    for root, _dirs, files in os.walk(output_dir):
+        for filename in files:
+            path = os.path.join(root, filename)
+            rel_path = os.path.relpath(path, output_dir).replace(os.sep, '/')
+            if HASHED_FILE_RE.search(filename) and rel_path not in referenced:
+                os.remove(path)
+                removed += 1
+    return removed
+
+def export_static(output_dir, full=False):
+    """公開中のWikiを静的ファイルとして書き出す
+
+    前回のマニフェストがあり full=False の場合は、updated_at が変わった
+    ページと、それらを含む検索シャードだけを再生成する。
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    previous = {} if full else load_manifest(output_dir)
+    previous_pages = previous.get('pages', {})
+    previous_shards = previous.get('search', {})
+
+    # 変更検出にはページ本文を読み込まない
+    rows = db.session.query(Page.id, Page.slug, Page.updated_at).filter(Page.visible()).all()
+    current = {
+        slug: (page_id, updated_at.isoformat() if updated_at else None)
+        for page_id, slug, updated_at in rows
+    }
+
+    pages = {}
+    changed_ids = []
+    for slug, (page_id, updated_at) in current.items():
+        entry = previous_pages.get(slug)
+        if (entry and entry['id'] == page_id and entry['updated_at'] == updated_at
+                and os.path.exists(os.path.join(output_dir, entry['json']))
+                and os.path.exists(os.path.join(output_dir, entry['html']))):
+            pages[slug] = entry
+        else:
+            changed_ids.append(page_id)
+
+    removed_slugs = [slug for slug in previous_pages if slug not in current]
+
+    for page in _load_pages(changed_ids):
+        name = _safe_name(page.slug)
+        pages[page.slug] = {
+            'id': page.id,
+            'title': page.title,
+            'updated_at': current[page.slug][1],
+            'json': _write_hashed(output_dir, 'pages', name, 'json', _dump_json(page.to_dict())),
+            'html': _write_hashed(output_dir, 'pages', name, 'html', render_page_html(page).encode('utf-8'))
+        }
+
+    # 検索インデックス（変更・削除されたページを含むシャードのみ再生成）
+    if full or not previous:
+        dirty_shards = {page_id // SEARCH_SHARD_SIZE for page_id, _ in current.values()}
+        search = {}
+    else:
+        dirty_shards = {page_id // SEARCH_SHARD_SIZE for page_id in changed_ids}
+        dirty_shards.update(previous_pages[slug]['id'] // SEARCH_SHARD_SIZE for slug in removed_slugs)
+        search = {
+            key: rel_path for key, rel_path in previous_shards.items()
+            if int(key) not in dirty_shards and os.path.exists(os.path.join(output_dir, rel_path))
+        }
+        dirty_shards.update(
+            int(key) for key in previous_shards if key not in search and int(key) not in dirty_shards
+        )
+    for shard in sorted(dirty_shards):
+        rel_path = _export_search_shard(output_dir, shard)
+        if rel_path:
+            search[str(shard)] = rel_path
+        else:
+            search.pop(str(shard), None)
+
+    # メニューとページ一覧は小さいので毎回生成する（内容が同じならファイル名も同じ）
+    root_menus = Menu.query.filter_by(parent_id=None, is_active=True).order_by(Menu.order_index).all()
+    menus_path = _write_hashed(output_dir, '', 'menus', 'json', _dump_json([menu.to_dict() for menu in root_menus]))
+
+    summaries = Page.query.options(defer(Page.content), joinedload(Page.author)).filter(
+        Page.visible()
+    ).order_by(Page.updated_at.desc()).all()
+    index_path = _write_hashed(output_dir, '', 'pages', 'json', _dump_json([page.to_summary_dict() for page in summaries]))
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'generated_at': datetime.utcnow().isoformat(),
+        'menus': menus_path,
+        'pages_index': index_path,
+        'pages': pages,
+        'search': search
+    }
+
+    # マニフェストは最後に置き換える（読み手が書きかけの状態を見ないように）
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(f'{manifest_path}.tmp', 'wb') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False, sort_keys=True, indent=1).encode('utf-8'))
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+    referenced = {menus_path, index_path, *search.values()}
+    for entry in pages.values():
+        referenced.update((entry['json'], entry['html']))
+    pruned = _prune(output_dir, referenced)
+
+    return {
+        'pages': len(pages),
+        'rendered': len(changed_ids),
+        'reused': len(pages) - len(changed_ids),
+        'removed': len(removed_slugs),
+        'search_shards_rendered': len(dirty_shards),
+        'files_pruned': pruned,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
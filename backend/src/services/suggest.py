@@ -0,0 +1,209 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from src.models.wiki import db, Page
+
+# 他のワーカーでの変更を取り込むための再確認間隔（秒）
+REFRESH_INTERVAL = 30
+
+# 1回の検索で走査するキーの上限
+MAX_SCAN = 200
+
+# キーの種類（小さいほど優先）
+RANK_TITLE = 0
+RANK_WORD = 1
+
+HIRAGANA_ROMAJI = {
+    'あ': 'a', 'い': 'i', 'う': 'u', 'え': 'e', 'お': 'o',
+    'か': 'ka', 'き': 'ki', 'く': 'ku', 'け': 'ke', 'こ': 'ko',
+    'さ': 'sa', 'し': 'shi', 'す': 'su', 'せ': 'se', 'そ': 'so',
+    'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
+    'な': 'na', 'に': 'ni', 'ぬ': 'nu', 'ね': 'ne', 'の': 'no',
+    'は': 'ha', 'ひ': 'hi', 'ふ': 'fu', 'へ': 'he', 'ほ': 'ho',
+    'ま': 'ma', 'み': 'mi', 'む': 'mu', 'め': 'me', 'も': 'mo',
+    'や': 'ya', 'ゆ': 'yu', 'よ': 'yo',
+    'ら': 'ra', 'り': 'ri', 'る': 'ru', 'れ': 're', 'ろ': 'ro',
+    'わ': 'wa', 'ゐ': 'i', 'ゑ': 'e', 'を': 'wo', 'ん': 'n',
+    'が': 'ga', 'ぎ': 'gi', 'ぐ': 'gu', 'げ': 'ge', 'ご': 'go',
+    'ざ': 'za', 'じ': 'ji', 'ず': 'zu', 'ぜ': 'ze', 'ぞ': 'zo',
+    'だ': 'da', 'ぢ': 'ji', 'づ': 'zu', 'で': 'de', 'ど': 'do',
+    'ば': 'ba', 'び': 'bi', 'ぶ': 'bu', 'べ': 'be', 'ぼ': 'bo',
+    'ぱ': 'pa', 'ぴ': 'pi', 'ぷ': 'pu', 'ぺ': 'pe', 'ぽ': 'po',
+    'ゔ': 'vu',
+    'ぁ': 'a', 'ぃ': 'i', 'ぅ': 'u', 'ぇ': 'e', 'ぉ': 'o', 'ゎ': 'wa',
+    'ゃ': 'ya', 'ゅ': 'yu', 'ょ': 'yo'
+}
+
+# 拗音（きゃ → kya など）
+YOON_ROMAJI = {
+    'ゃ': 'a', 'ゅ': 'u', 'ょ': 'o'
+}
+YOON_SPECIAL = {'し': 'sh', 'ち': 'ch', 'じ': 'j', 'ぢ': 'j'}
+
+def normalize(text):
+    """全角・半角と大文字小文字を揃え、カタカナをひらがなに変換"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(
+        chr(ord(ch) - 0x60) if 'ァ' <= ch <= 'ヶ' else ch
+        for ch in text
+    )
+
+def to_romaji(hiragana, long_vowel='-'):
+    """ひらがなをヘボン式ローマ字に変換（漢字などはそのまま残す）
+
+    長音「ー」は long_vowel に置き換える。'repeat' の場合は直前の母音を繰り返す。
+    """
+    result = []
+    double_next = False
+    i = 0
+    while i < len(hiragana):
+        ch = hiragana[i]
+        next_ch = hiragana[i + 1] if i + 1 < len(hiragana) else ''
+
+        if ch == 'っ':
+            double_next = True
+            i += 1
+            continue
+
+        if ch in HIRAGANA_ROMAJI and next_ch in YOON_ROMAJI and ch not in 'あいうえおぁぃぅぇぉ':
+            base = YOON_SPECIAL.get(ch, HIRAGANA_ROMAJI[ch][:-1] + 'y')
+            romaji = base + YOON_ROMAJI[next_ch]
+            i += 2
+        elif ch == 'ー':
+            if long_vowel == 'repeat':
+                romaji = result[-1][-1] if result and result[-1] and result[-1][-1] in 'aiueo' else ''
+            else:
+                romaji = long_vowel
+            i += 1
+        else:
+            romaji = HIRAGANA_ROMAJI.get(ch, ch)
+            i += 1
+
+        if double_next:
+            if romaji and romaji[0] not in 'aiueon':
+                romaji = ('t' if romaji.startswith('ch') else romaji[0]) + romaji
+            double_next = False
+        result.append(romaji)
+    return ''.join(result)
+
+def index_keys(title, slug):
+    """ページのタイトル・スラッグから (キー, 優先度) の一覧を生成"""
+    normalized = normalize(title)
+    compact = re.sub(r'\s+', '', normalized)
+    keys = {
+        (compact, RANK_TITLE),
+        (normalize(slug), RANK_TITLE),
+        (to_romaji(compact), RANK_TITLE),
+        (to_romaji(compact, long_vowel=''), RANK_TITLE),
+        (to_romaji(compact, long_vowel='repeat'), RANK_TITLE)
+    }
+    words = [word for word in re.split(r'[\s\-_/・、。()（）「」]+', normalized) if word]
+    if len(words) > 1:
+        for word in words[1:]:
+            keys.add((word, RANK_WORD))
+            keys.add((to_romaji(word), RANK_WORD))
+    return {(key, rank) for key, rank in keys if key}
+
+class TitleIndex:
+    """公開ページのタイトル・スラッグの前方一致インデックス（ワーカープロセスごと）
+
+    キーはソート済み配列に (キー, 優先度, ページID) として保持し、
+    bisectで前方一致の範囲を求める。
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._page_keys = {}
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._signature = None
+        self._checked_at = 0.0
+
+    def _signature_query(self):
+        return db.session.query(db.func.count(Page.id), db.func.max(Page.updated_at)).filter(
+            Page.visible()
+        ).one()
+
+    def rebuild(self):
+        """データベースから全件を読み込み直す"""
+        rows = db.session.query(Page.id, Page.title, Page.slug).filter(Page.visible()).all()
+        signature = self._signature_query()
+
+        keys = []
+        page_keys = {}
+        entries = {}
+        for page_id, title, slug in rows:
+            entries[page_id] = {'id': page_id, 'title': title, 'slug': slug}
+            page_keys[page_id] = [(key, rank, page_id) for key, rank in index_keys(title, slug)]
+            keys.extend(page_keys[page_id])
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._page_keys = page_keys
+            self._entries = entries
+            self._signature = signature
+            self._checked_at = time.monotonic()
+            self._loaded = True
+
+    def ensure_fresh(self):
+        """未読み込み、または他のワーカーでの変更を検出した場合に再構築"""
+        if not self._loaded:
+            self.rebuild()
+            return
+        if time.monotonic() - self._checked_at < REFRESH_INTERVAL:
+            return
+        self._checked_at = time.monotonic()
+        if self._signature_query() != self._signature:
+            self.rebuild()
+
+    def remove(self, page_id):
+        """ページをインデックスから削除"""
+        with self._lock:
+            for entry in self._page_keys.pop(page_id, []):
+                position = bisect_left(self._keys, entry)
+                if position < len(self._keys) and self._keys[position] == entry:
+                    del self._keys[position]
+            self._entries.pop(page_id, None)
+
+    def upsert(self, page):
+        """ページの作成・更新をインデックスに反映"""
+        if not self._loaded:
+            return
+        with self._lock:
+            self.remove(page.id)
+            if not page.is_published or page.deleted_at is not None:
+                return
+            entries = [(key, rank, page.id) for key, rank in index_keys(page.title, page.slug)]
+            for entry in entries:
+                insort(self._keys, entry)
+            self._page_keys[page.id] = entries
+            self._entries[page.id] = {'id': page.id, 'title': page.title, 'slug': page.slug}
+
+    def suggest(self, query, limit=10):
+        """前方一致するページを優先度・タイトルの短い順に返す"""
+        prefix = re.sub(r'\s+', '', normalize(query))
+        if not prefix:
+            return []
+
+        best = {}
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), position + MAX_SCAN)
+            while position < end:
+                key, rank, page_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if page_id not in best or rank < best[page_id]:
+                    best[page_id] = rank
+                position += 1
+            entries = [(rank, self._entries[page_id]) for page_id, rank in best.items()]
+
+        entries.sort(key=lambda item: (item[0], len(item[1]['title']), item[1]['title']))
+        return [entry for _rank, entry in entries[:limit]]
+
+title_index = TitleIndex()
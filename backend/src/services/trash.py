@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.models.wiki import db, Page, PageHistory, Menu, PageLink, PageViewDaily, PageAttachment
+
+# ゴミ箱の一括削除で一度に処理するページ数
+PURGE_BATCH_SIZE = 100
+
+def _set_deleted_at(page, deleted_at):
+    """deleted_at だけを書き換える
+
+    ORMで代入すると Page.updated_at の onupdate が働き、ゴミ箱への移動・復元が
+    ページの編集として扱われてしまうため、updated_at を自身で上書きするUPDATE文で行う。
+    """
+    Page.query.filter_by(id=page.id).update(
+        {Page.deleted_at: deleted_at, Page.updated_at: Page.updated_at},
+        synchronize_session=False
+    )
+    set_committed_value(page, 'deleted_at', deleted_at)
+
+def move_to_trash(page):
+    """ページをゴミ箱に移動（関連データはそのまま残す。コミットは呼び出し側）"""
+    _set_deleted_at(page, datetime.utcnow())
+
+def restore_page(page):
+    """ゴミ箱からページを戻す（コミットは呼び出し側）"""
+    _set_deleted_at(page, None)
+
+def purge_pages(page_ids):
+    """ページと関連データを完全に削除する
+
+    履歴などを1件ずつ読み込まず、テーブルごとに1文のDELETE/UPDATEで処理するため、
+    履歴の件数に関係なくメモリ使用量は一定。メニュー項目はページとの紐付けだけ外す。
+    コミットは呼び出し側で行う。
+    """
+    page_ids = list(page_ids)
+    if not page_ids:
+        return 0
+
+    PageHistory.query.filter(PageHistory.page_id.in_(page_ids)).delete(synchronize_session=False)
+    PageLink.query.filter(PageLink.source_page_id.in_(page_ids)).delete(synchronize_session=False)
+    PageViewDaily.query.filter(PageViewDaily.page_id.in_(page_ids)).delete(synchronize_session=False)
+    PageAttachment.query.filter(PageAttachment.page_id.in_(page_ids)).delete(synchronize_session=False)
+    Menu.query.filter(Menu.page_id.in_(page_ids)).update({Menu.page_id: None}, synchronize_session=False)
+    deleted = Page.query.filter(Page.id.in_(page_ids)).delete(synchronize_session=False)
+
+    # セッションに残っている削除済みオブジェクトを使わせない
+    db.session.expire_all()
+    return deleted
+
+def purge_trash(older_than_days=30):
+    """ゴミ箱に移動してから older_than_days 日以上経ったページを完全に削除"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    purged = 0
+    while True:
+        page_ids = [
+            page_id for (page_id,) in
+            db.session.query(Page.id).filter(
+                Page.deleted_at.isnot(None),
+                Page.deleted_at < cutoff
+            ).limit(PURGE_BATCH_SIZE)
+        ]
+        if not page_ids:
+            break
+        purged += purge_pages(page_ids)
+        db.session.commit()
+    return purged
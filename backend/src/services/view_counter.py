@@ -0,0 +1,125 @@
+import atexit
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models.wiki import db, Page, PageViewDaily
+
+class ViewCounter:
+    """ページ閲覧数をワーカー内で集計し、一定間隔でまとめてDBに書き込む
+
+    閲覧ごとにUPDATEするとSQLiteの書き込みロックで読み込みが直列化されるため、
+    (ページID, 日付) ごとの加算値をメモリに溜めて1文のUPSERTで反映する。
+
+    失われる可能性があるのは、プロセスが強制終了された時点でまだ書き込まれて
+    いない分（最大で VIEW_FLUSH_INTERVAL 秒、または VIEW_FLUSH_THRESHOLD 件）
+    のみ。通常終了時は atexit で残りを書き込む。書き込みに失敗した分は
+    次回に持ち越す。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pending = Counter()
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('VIEW_FLUSH_INTERVAL', float(os.getenv('VIEW_FLUSH_INTERVAL', '10')))
+        app.config.setdefault('VIEW_FLUSH_THRESHOLD', int(os.getenv('VIEW_FLUSH_THRESHOLD', '1000')))
+        self.app = app
+        app.extensions['view_counter'] = self
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        """書き込みスレッドを起動（fork後のワーカーでは起動し直す）"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = self.app.config['VIEW_FLUSH_INTERVAL']
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.warning('Failed to flush page views: %s', e)
+
+    def record(self, page_id):
+        """閲覧を1件記録（DBにはアクセスしない）"""
+        key = (page_id, datetime.utcnow().date())
+        with self._lock:
+            self._pending[key] += 1
+            self._pending_total += 1
+            pending_total = self._pending_total
+        if pending_total >= self.app.config['VIEW_FLUSH_THRESHOLD']:
+            self._wake.set()
+        self._ensure_thread()
+
+    def flush(self):
+        """溜まっている閲覧数をDBに書き込む"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._pending_total = 0
+        if not pending:
+            return 0
+
+        rows = [
+            {'page_id': page_id, 'day': day, 'views': views}
+            for (page_id, day), views in pending.items()
+        ]
+        try:
+            with self.app.app_context():
+                dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+                stmt = dialect.insert(PageViewDaily.__table__).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['page_id', 'day'],
+                    set_={'views': PageViewDaily.__table__.c.views + stmt.excluded.views}
+                )
+                db.session.execute(stmt)
+                db.session.commit()
+        except Exception:
+            # 書き込めなかった分は次回に持ち越す
+            with self._lock:
+                self._pending.update(pending)
+                self._pending_total += sum(pending.values())
+            raise
+        return sum(pending.values())
+
+def get_view_counter():
+    """アプリに登録されたViewCounterを返す"""
+    return current_app.extensions['view_counter']
+
+def get_popular_pages(days=7, limit=10):
+    """直近 days 日間の閲覧数が多い公開ページを (ページ, 閲覧数) で返す"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    total_views = db.func.sum(PageViewDaily.views).label('total_views')
+    return db.session.query(Page, total_views).join(
+        PageViewDaily, PageViewDaily.page_id == Page.id
+    ).filter(
+        PageViewDaily.day >= since,
+        Page.visible()
+    ).group_by(Page.id).order_by(total_views.desc()).limit(limit).all()
+
+def get_daily_views(page_id, days=30):
+    """ページの日別閲覧数（古い順）"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    return PageViewDaily.query.filter(
+        PageViewDaily.page_id == page_id,
+        PageViewDaily.day >= since
+    ).order_by(PageViewDaily.day).all()
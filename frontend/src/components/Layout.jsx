@@ -16,6 +16,9 @@ import { useAuth } from '../hooks/useAuth.jsx';
 import { menusAPI, pagesAPI } from '../lib/api';
 import zenLogo from '../assets/zen-logo.jpg';
 
+// 検索を実行するまでの待ち時間（ミリ秒）
+const SEARCH_DEBOUNCE_MS = 300;
+
 const Layout = ({ children, currentPage, onPageChange, onCreatePage, onOpenAdminPanel }) => {
   const { user, isAuthenticated, logout, hasRole } = useAuth();
   const [sidebarOpen, setSidebarOpen] = useState(true);
@@ -38,23 +41,40 @@ const Layout = ({ children, currentPage, onPageChange, onCreatePage, onOpenAdmin
     fetchMenus();
   }, []);
 
-  // 検索機能
-  const handleSearch = async (query) => {
-    setSearchQuery(query);
-    
-    if (query.trim().length > 0) {
-      try {
-        const response = await pagesAPI.searchPages(query);
-        setSearchResults(response.data);
-        setShowSearchResults(true);
-      } catch (error) {
-        console.error('検索エラー:', error);
-        setSearchResults([]);
-      }
-    } else {
+  // 検索機能（入力が止まってから検索し、1文字ごとにAPIを呼ばない）
+  useEffect(() => {
+    if (searchQuery.trim().length === 0) {
       setShowSearchResults(false);
       setSearchResults([]);
+      return;
     }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await pagesAPI.searchPages(searchQuery);
+        // 古い検索の結果で上書きしない
+        if (!cancelled) {
+          setSearchResults(response.data);
+          setShowSearchResults(true);
+        }
+      } catch (error) {
+        // レート制限（429）の場合は前回の結果をそのまま表示する
+        if (!cancelled && error.response?.status !== 429) {
+          console.error('検索エラー:', error);
+          setSearchResults([]);
+        }
+      }
+    }, SEARCH_DEBOUNCE_MS);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  const handleSearch = (query) => {
+    setSearchQuery(query);
   };
 
   // メニュー項目をレンダリング
@@ -64,14 +64,26 @@ export const pagesAPI = {
   // ページを更新
   updatePage: (pageId, pageData) => api.put(`/pages/${pageId}`, pageData),
   
-  // ページを削除
+  // ページをゴミ箱に移動
   deletePage: (pageId) => api.delete(`/pages/${pageId}`),
   
+  // ゴミ箱のページ一覧を取得
+  getTrash: () => api.get('/pages/trash'),
+  
+  // ゴミ箱からページを復元
+  restorePage: (pageId) => api.post(`/pages/${pageId}/restore`),
+  
+  // ページを完全に削除
+  purgePage: (pageId) => api.delete(`/pages/${pageId}/purge`),
+  
   // ページの履歴を取得
   getPageHistory: (pageId) => api.get(`/pages/${pageId}/history`),
   
   // ページを検索
   searchPages: (query) => api.get(`/pages/search?q=${encodeURIComponent(query)}`),
+
+  // タイトル候補を取得（入力補完用）
+  suggestPages: (query, limit = 10) => api.get(`/pages/suggest?q=${encodeURIComponent(query)}&limit=${limit}`),
 };
 
 // メニュー関連のAPI
@@ -95,6 +107,44 @@ export const menusAPI = {
   moveMenu: (menuId, moveData) => api.put(`/menus/${menuId}/move`, moveData),
 };
 
+// ユーザー管理のAPI（管理者のみ）
+export const usersAPI = {
+  // ユーザー一覧を取得（params: { role, q, after, limit }、次のページは next_cursor を after に指定）
+  getUsers: (params = {}) => api.get('/users', { params }),
+  
+  // 特定のユーザーを取得
+  getUser: (userId) => api.get(`/users/${userId}`),
+  
+  // 複数ユーザーの役割を一括変更
+  updateRoles: (userIds, role) => api.put('/users/roles', { user_ids: userIds, role }),
+};
+
+// 初期表示用のAPI
+export const bootstrapAPI = {
+  // ユーザー・メニュー・ページ一覧・初期ページを一括取得
+  // etags: 前回のレスポンスの etags（一致したパーツは省略され unchanged に入る）
+  getBootstrap: (page = 'home', etags = {}) => api.get('/bootstrap', {
+    params: {
+      page,
+      etags: Object.entries(etags).map(([name, etag]) => `${name}:${etag}`).join(','),
+    },
+  }),
+};
+
+// 添付ファイルのAPI
+export const attachmentsAPI = {
+  // ファイルをアップロード（本文には返ってきた url を埋め込む）
+  upload: (file) => api.post('/attachments', file, {
+    headers: {
+      'Content-Type': 'application/octet-stream',
+      'X-Filename': encodeURIComponent(file.name),
+    },
+  }),
+  
+  // ページから参照されている添付ファイル一覧を取得
+  getPageAttachments: (pageId) => api.get('/attachments', { params: { page_id: pageId } }),
+};
+
 // ヘルスチェック
 export const healthAPI = {
   check: () => api.get('/health'),